@@ -0,0 +1,192 @@
+import argparse
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import sonderzulage_berechnung as zulage
+from touren_generator import write_workbook
+
+# -------------------------------
+# Pipeline stufenweise messen
+# -------------------------------
+# "read" enthält AZ-/Datumsfilter, der Stream-Leser filtert schon beim Lesen
+STAGES = ["read", "names", "earnings", "layout", "styling", "write"]
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+RESULTS_PATH = Path(__file__).resolve().parent / "results.jsonl"
+
+def _max_rss_mb() -> float:
+    # ru_maxrss: Linux in KiB, macOS in Bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class StageTimer:
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name: str, func, *args):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        stage = {"seconds": round(seconds, 4), "max_rss_mb": _max_rss_mb()}
+        if self.trace_memory:
+            stage["peak_alloc_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+            tracemalloc.stop()
+        self.stages[name] = stage
+        return result
+
+def _write(sheets: list, plans: list, engine: str) -> bytes:
+    buffer = io.BytesIO()
+    if engine == "xlsxwriter":
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+        formats = zulage._xlsxwriter_formats(workbook)
+        for month_sheet, plan in zip(sheets, plans):
+            zulage._write_month_sheet_xlsxwriter(workbook, formats, month_sheet, plan=plan)
+        workbook.close()
+    else:
+        workbook = zulage.Workbook()
+        workbook.remove(workbook.active)
+        zulage.register_named_styles(workbook)
+        for month_sheet, plan in zip(sheets, plans):
+            zulage._write_month_sheet_openpyxl(workbook, month_sheet, plan=plan)
+        workbook.save(buffer)
+    return buffer.getvalue()
+
+def benchmark_file(path: Path, engine: str = zulage.EXPORT_ENGINE, trace_memory: bool = False) -> dict:
+    timer = StageTimer(trace_memory)
+    touren = timer.run("read", zulage.read_touren, str(path))
+    extracted = timer.run("names", zulage.resolve_driver_names, touren)
+    extracted = timer.run("earnings", lambda: zulage.compact_tours(
+        zulage.apply_rate_table(zulage.finalize_tours(extracted))))
+    sheets = timer.run("layout", lambda: list(zulage.iter_month_sheets(extracted)))
+    plans = timer.run("styling", lambda: [zulage.plan_sheet(month_sheet) for month_sheet in sheets])
+    report = timer.run("write", _write, sheets, plans, engine)
+
+    return {
+        "file": path.name,
+        "rows_read": len(touren),
+        "tours": len(extracted),
+        "sheets": len(sheets),
+        "report_bytes": len(report),
+        "total_seconds": round(sum(stage["seconds"] for stage in timer.stages.values()), 4),
+        "stages": timer.stages,
+    }
+
+def _git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "-C", str(ROOT), "describe", "--always", "--dirty"],
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unbekannt"
+    except (OSError, subprocess.SubprocessError):
+        return "unbekannt"
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "reader": zulage.READER_MODE,
+    }
+
+def run(sizes: list, data_dir: Path, engine: str, trace_memory: bool, label: str) -> list:
+    data_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+    for rows in sizes:
+        path = data_dir / f"touren_{rows}.xlsx"
+        if not path.exists():
+            write_workbook(path, rows)
+        result = benchmark_file(path, engine, trace_memory)
+        result.update({
+            "rows": rows,
+            "engine": engine,
+            "revision": _git_revision(),
+            "label": label,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "environment": _environment(),
+        })
+        results.append(result)
+        stages = "  ".join(f"{name} {result['stages'][name]['seconds']:.2f}s" for name in STAGES)
+        print(f"{rows:>9} Zeilen  {result['total_seconds']:7.2f}s  {stages}  RSS {_max_rss_mb()} MB")
+    return results
+
+# -------------------------------
+# Ergebnisse vergleichen
+# -------------------------------
+def load_results(path: Path) -> list:
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _latest(results: list, revision: str) -> dict:
+    # je (Zeilen, Engine) der letzte Lauf der Revision
+    latest = {}
+    for result in results:
+        if result["revision"] == revision or result.get("label") == revision:
+            latest[(result["rows"], result["engine"])] = result
+    return latest
+
+def compare(results: list, baseline: str, candidate: str) -> None:
+    old, new = _latest(results, baseline), _latest(results, candidate)
+    for key in sorted(old.keys() & new.keys()):
+        rows, engine = key
+        print(f"{rows} Zeilen, {engine}: {baseline} -> {candidate}")
+        for name in STAGES + ["total"]:
+            if name == "total":
+                a, b = old[key]["total_seconds"], new[key]["total_seconds"]
+            else:
+                a, b = old[key]["stages"][name]["seconds"], new[key]["stages"][name]["seconds"]
+            ratio = b / a if a else float("nan")
+            flag = "  <-- langsamer" if ratio > 1.1 and b - a > 0.05 else ""
+            print(f"  {name:<9} {a:9.3f}s {b:9.3f}s  x{ratio:5.2f}{flag}")
+    if not old.keys() & new.keys():
+        print("Keine gemeinsamen Läufe gefunden.", file=sys.stderr)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark der Zulage-Pipeline je Stufe")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Benchmark ausführen und Ergebnisse anhängen")
+    run_parser.add_argument("sizes", type=int, nargs="*", default=DEFAULT_SIZES)
+    run_parser.add_argument("--data-dir", type=Path, default=Path(__file__).resolve().parent / "data")
+    run_parser.add_argument("--engine", choices=("openpyxl", "xlsxwriter"), default=zulage.EXPORT_ENGINE)
+    run_parser.add_argument("--trace-memory", action="store_true",
+                            help="Spitzen-Speicher je Stufe per tracemalloc (langsamer)")
+    run_parser.add_argument("--label", default="", help="Name des Laufs für den Vergleich")
+    run_parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+
+    compare_parser = sub.add_parser("compare", help="zwei Revisionen oder Labels vergleichen")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        compare(load_results(args.results), args.baseline, args.candidate)
+        return 0
+
+    results = run(args.sizes, args.data_dir, args.engine, args.trace_memory, args.label)
+    with args.results.open("a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(f"Ergebnisse -> {args.results}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sonderzulage_berechnung import AZ_SPALTE, FAHRZEUG_ART, TOUREN_SPALTEN, name_to_personalnummer
+
+# -------------------------------
+# Synthetische "Touren"-Mappen im Layout der echten Exporte
+# -------------------------------
+SPALTEN = 18
+NBSP = "\u00a0"
+
+# Anteile je Zeile (Rest = keine AZ-Tour)
+AZ_ANTEIL = 0.7
+# AZ-Markierungen in Spalte N, wie sie in den Exporten vorkommen (XAZ zählt nicht)
+AZ_WERTE = ["AZ", "AZ", "AZ", "az", "AZ 1", "AZ-Tour"]
+NICHT_AZ_WERTE = ["Frei", "Urlaub", "XAZ", None]
+# Fahrzeuge ohne Zulage, damit nicht jede Tour zählt
+FREMD_LKW = [101, 111, 205, 310, 777, 999]
+
+def _names() -> list:
+    return [(nachname, vorname) for nachname, vornamen in name_to_personalnummer.items() for vorname in vornamen]
+
+def _noisy(text: str, rng: random.Random) -> str:
+    # geschützte Leerzeichen und Leerzeichen am Rand wie in kopierten Namen
+    r = rng.random()
+    if r < 0.05:
+        return text + NBSP
+    if r < 0.08:
+        return " " + text
+    if r < 0.10:
+        return text.replace(" ", NBSP)
+    return text
+
+def _lkw(rng: random.Random):
+    # Spalte L ist in AZ-Zeilen immer gefüllt, selten mit Text (Mietfahrzeuge)
+    r = rng.random()
+    if r < 0.55:
+        return rng.choice(list(FAHRZEUG_ART))
+    if r < 0.97:
+        return rng.choice(FREMD_LKW)
+    return rng.choice(["Miete", "extern"])
+
+def generate_rows(rows: int, seed: int = 1, start: date = date(2025, 1, 1), days: int = 365):
+    rng = random.Random(seed)
+    names = _names()
+    spalte = {name: i for i, name in TOUREN_SPALTEN.items()}
+
+    for i in range(rows):
+        row = [None] * SPALTEN
+        row[spalte["Tour"]] = rng.choice([f"{rng.randint(1000, 9999)}", rng.randint(1000, 9999), None])
+        nachname, vorname = rng.choice(names)
+
+        r = rng.random()
+        if r < 0.75:
+            # Fahrer in D/E
+            row[spalte["Nachname_DE"]] = _noisy(nachname, rng)
+            row[spalte["Vorname_DE"]] = _noisy(vorname, rng)
+        elif r < 0.93:
+            # D/E leer, Fahrer in G/H
+            row[spalte["Nachname_GH"]] = _noisy(nachname, rng)
+            row[spalte["Vorname_GH"]] = _noisy(vorname, rng)
+        elif r < 0.97:
+            # nur Nachname in D -> G/H wird genommen
+            row[spalte["Nachname_DE"]] = nachname
+            row[spalte["Nachname_GH"]], row[spalte["Vorname_GH"]] = rng.choice(names)
+        else:
+            row[spalte["Nachname_DE"]] = rng.choice([None, " ", NBSP])
+
+        row[spalte["LKW1"]] = rng.choice(list(FAHRZEUG_ART)) if rng.random() < 0.2 else None
+        row[spalte["LKW"]] = _lkw(rng)
+        row[spalte["Art"]] = rng.choice(["SZM", "Solo", None])
+        row[AZ_SPALTE] = rng.choice(AZ_WERTE) if rng.random() < AZ_ANTEIL else rng.choice(NICHT_AZ_WERTE)
+
+        tag = start + timedelta(days=rng.randrange(days))
+        row[spalte["Datum"]] = tag.strftime("%d.%m.%Y") if rng.random() < 0.995 else "offen"
+        row[spalte["Tour_Q"]] = f"Q{i % 5000}" if row[spalte["Tour"]] is None and rng.random() < 0.8 else None
+        yield row
+
+def write_workbook(path, rows: int, seed: int = 1, **kwargs) -> Path:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Touren")
+    sheet.append([f"Spalte {i + 1}" for i in range(SPALTEN)])
+    for row in generate_rows(rows, seed, **kwargs):
+        sheet.append(row)
+    path = Path(path)
+    workbook.save(path)
+    return path
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Synthetische Touren-Mappen erzeugen")
+    parser.add_argument("rows", type=int, nargs="+", help="Zeilen je Mappe, z.B. 1000 100000 1000000")
+    parser.add_argument("-d", "--directory", default="benchmarks/data")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--days", type=int, default=365, help="Zeitraum ab 01.01.2025 in Tagen")
+    args = parser.parse_args(argv)
+
+    directory = Path(args.directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for rows in args.rows:
+        path = write_workbook(directory / f"touren_{rows}.xlsx", rows, seed=args.seed, days=args.days)
+        print(path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
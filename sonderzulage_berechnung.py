@@ -1,8 +1,32 @@
+import numpy as np
 import pandas as pd
-import streamlit as st
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Font, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+import argparse
+import cProfile
+import glob
+import hashlib
+import importlib
+import io
+import json
+import os
+import pstats
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from copy import copy
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
 
 # Deutsche Monatsnamen
 GERMAN_MONTHS = [
@@ -14,17 +38,204 @@ def get_german_month_name(month_number: int) -> str:
     return GERMAN_MONTHS[month_number]
 
 # -------------------------------
-# Fahrzeugart (ERWEITERT)
+# Fahrzeugart & Zulage (ERWEITERT)
 # -------------------------------
-def define_art(value: int) -> str:
-    if value in [602, 156]:
-        return "Gigaliner"
-    elif value in [350, 620]:
-        return "Tandem"
+FAHRZEUG_ART = {
+    602: "Gigaliner", 156: "Gigaliner",
+    350: "Tandem", 620: "Tandem",
     # Gliederzug inkl. neue LKW
-    elif value in [520, 266, 458, 548, 541, 542, 543, 558]:
-        return "Gliederzug"
-    return "Unbekannt"
+    520: "Gliederzug", 266: "Gliederzug", 458: "Gliederzug", 548: "Gliederzug",
+    541: "Gliederzug", 542: "Gliederzug", 543: "Gliederzug", 558: "Gliederzug",
+}
+
+# Zulage in € je Tour und Fahrzeug
+ZULAGE_JE_ART = {"Gigaliner": 40, "Tandem": 20, "Gliederzug": 20}
+
+# Fuhrpark-Datei mit Gültigkeitszeiträumen (CSV oder YAML); fehlt sie, gilt FAHRZEUG_ART unbefristet
+FLEET_REGISTRY_PATH = os.environ.get("ZULAGE_FLEET_PATH", str(Path(__file__).with_name("fahrzeuge.csv")))
+
+# Gültigkeit in Tagen seit 1970, offene Grenzen = ganzer darstellbarer Bereich
+_TAG_OFFSET = 2 ** 19
+_TAG_MIN, _TAG_MAX = -_TAG_OFFSET, _TAG_OFFSET - 1
+
+class FleetEntry(NamedTuple):
+    nummer: int
+    art: str
+    zulage: int
+    gueltig_ab: Optional[pd.Timestamp] = None   # einschließlich, None = offen
+    gueltig_bis: Optional[pd.Timestamp] = None  # einschließlich, None = offen
+
+class RateTable(NamedTuple):
+    # Zeiträume je Fahrzeug, sortiert nach (Nummer, gültig ab); Suche per searchsorted
+    arten: np.ndarray      # Art-Index -> Bezeichnung (0 = "Unbekannt")
+    keys: np.ndarray       # Nummer * 2**20 + gültig ab (Tag + Offset)
+    nummern: np.ndarray    # Nummer je Zeitraum
+    bis: np.ndarray        # gültig bis (Tag) je Zeitraum
+    art_index: np.ndarray  # Art-Index je Zeitraum
+    zulage: np.ndarray     # Zulage in € je Zeitraum
+    fingerprint: str       # Inhalt, für den Upload-Cache
+
+def _tag(value: Optional[pd.Timestamp], default: int) -> int:
+    if value is None or pd.isna(value):
+        return default
+    return int((pd.Timestamp(value).normalize() - pd.Timestamp("1970-01-01")).days)
+
+def compile_fleet(entries: list) -> RateTable:
+    entries = sorted(entries, key=lambda e: (e.nummer, _tag(e.gueltig_ab, _TAG_MIN)))
+    for prev, entry in zip(entries, entries[1:]):
+        if prev.nummer == entry.nummer and _tag(entry.gueltig_ab, _TAG_MIN) <= _tag(prev.gueltig_bis, _TAG_MAX):
+            raise ValueError(f"Fahrzeug {entry.nummer}: Gültigkeitszeiträume überschneiden sich")
+    for entry in entries:
+        if _tag(entry.gueltig_ab, _TAG_MIN) > _tag(entry.gueltig_bis, _TAG_MAX):
+            raise ValueError(f"Fahrzeug {entry.nummer}: gültig ab liegt nach gültig bis")
+
+    arten = ["Unbekannt"] + sorted({e.art for e in entries})
+    von = np.array([_tag(e.gueltig_ab, _TAG_MIN) for e in entries], dtype=np.int64)
+    nummern = np.array([e.nummer for e in entries], dtype=np.int64)
+    fingerprint = hashlib.sha256(repr([tuple(map(str, e)) for e in entries]).encode("utf-8")).hexdigest()[:16]
+    return RateTable(
+        arten=np.array(arten, dtype=object),
+        keys=nummern * (2 * _TAG_OFFSET) + von + _TAG_OFFSET,
+        nummern=nummern,
+        bis=np.array([_tag(e.gueltig_bis, _TAG_MAX) for e in entries], dtype=np.int64),
+        art_index=np.array([arten.index(e.art) for e in entries], dtype=np.int16),
+        zulage=np.array([e.zulage for e in entries], dtype=np.int64),
+        fingerprint=fingerprint,
+    )
+
+def compile_rate_table(fahrzeug_art: dict = FAHRZEUG_ART, zulage_je_art: dict = ZULAGE_JE_ART) -> RateTable:
+    return compile_fleet([FleetEntry(nummer, art, zulage_je_art.get(art, 0)) for nummer, art in fahrzeug_art.items()])
+
+RATE_TABLE = compile_rate_table()
+
+def lookup_rates(table: RateTable, nummer: np.ndarray, datum) -> tuple:
+    # nummer: Fahrzeugnummer je Zeile (-1 = keine), datum: Tourdatum je Zeile
+    # -> (Art-Index, Zulage) des am Datum gültigen Eintrags
+    nummer = np.asarray(nummer, dtype=np.int64)
+    tage = np.asarray(pd.to_datetime(datum)).astype("datetime64[D]")
+    # ohne Datum zählen nur Einträge mit offenem Beginn
+    tage = np.where(np.isnat(tage), _TAG_MIN, np.clip(tage.astype(np.int64), _TAG_MIN, _TAG_MAX))
+
+    known = (nummer >= 0) & (nummer <= (table.nummern.max() if len(table.nummern) else -1))
+    keys = np.where(known, nummer, 0) * (2 * _TAG_OFFSET) + tage + _TAG_OFFSET
+    pos = np.searchsorted(table.keys, keys, side="right") - 1
+    safe = np.clip(pos, 0, None)
+    if len(table.keys):
+        hit = known & (pos >= 0) & (table.nummern[safe] == nummer) & (tage <= table.bis[safe])
+        return np.where(hit, table.art_index[safe], 0), np.where(hit, table.zulage[safe], 0)
+    return np.zeros(len(nummer), dtype=np.int16), np.zeros(len(nummer), dtype=np.int64)
+
+def _registry_date(value) -> Optional[pd.Timestamp]:
+    if value is None or (isinstance(value, str) and not value.strip()) or pd.isna(value):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        parsed = pd.to_datetime(value, format="%d.%m.%Y", errors="coerce")
+        if pd.isna(parsed):
+            parsed = pd.to_datetime(value, format="%Y-%m-%d", errors="coerce")
+        if pd.isna(parsed):
+            raise ValueError(f"Ungültiges Datum {value!r} (TT.MM.JJJJ oder JJJJ-MM-TT)")
+        return parsed
+    return pd.Timestamp(value)
+
+def read_fleet_registry(path) -> list:
+    # CSV (Trennzeichen ";" oder ","): nummer, art, zulage (leer = Betrag der Art), gueltig_ab, gueltig_bis
+    # YAML: zulagen: {Art: Betrag}, fahrzeuge: [{nummer, art, zulage?, gueltig_ab?, gueltig_bis?}]
+    path = Path(path)
+    zulagen = dict(ZULAGE_JE_ART)
+    if path.suffix.lower() in (".yaml", ".yml"):
+        import yaml
+
+        raw = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+        zulagen.update(raw.get("zulagen") or {})
+        rows = raw.get("fahrzeuge") or []
+    else:
+        rows = pd.read_csv(path, sep=None, engine="python", dtype=str, keep_default_na=False,
+                           encoding="utf-8-sig").to_dict("records")
+
+    entries = []
+    for i, row in enumerate(rows, start=1):
+        row = {str(k).strip().lower(): v for k, v in row.items()}
+        try:
+            art = str(row["art"]).strip()
+            zulage = row.get("zulage")
+            if zulage is None or str(zulage).strip() == "":
+                if art not in zulagen:
+                    raise ValueError(f"keine Zulage für Art {art!r}")
+                zulage = zulagen[art]
+            entries.append(FleetEntry(int(str(row["nummer"]).strip()), art, int(str(zulage).strip()),
+                                      _registry_date(row.get("gueltig_ab")), _registry_date(row.get("gueltig_bis"))))
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{path.name}, Eintrag {i}: {e}") from None
+    return entries
+
+@lru_cache(maxsize=4)
+def load_fleet_registry(path: str, stamp: tuple) -> RateTable:
+    # stamp = (mtime, Größe): geänderte Datei -> neuer Cache-Eintrag
+    return compile_fleet(read_fleet_registry(path))
+
+def file_stamp(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def current_rate_table(path: str = FLEET_REGISTRY_PATH) -> RateTable:
+    stamp = file_stamp(path)
+    return RATE_TABLE if stamp is None else load_fleet_registry(str(path), stamp)
+
+def define_art(value: int, datum=None) -> str:
+    table = current_rate_table()
+    art_index, _ = lookup_rates(table, [value], [datum])
+    return table.arten[art_index[0]]
+
+def _nummer_lkw1(text: str):
+    # Spalte K: nur reine Ziffern zählen
+    return int(text) if text.isdigit() else None
+
+def _nummer_lkw(text: str):
+    # Spalte L wird zu "E-<wert>", die Nummer ist der Teil nach "E-" bis zum nächsten "-"
+    tail = text.split("-")[0]
+    return int(tail) if tail.isdigit() else None
+
+def _vehicle_numbers(col: pd.Series, parse) -> np.ndarray:
+    # Jede unterschiedliche Zelle nur einmal parsen, dann per Index auf alle Zeilen verteilen
+    # -> Fahrzeugnummer je Zeile, -1 = keine
+    if col.dtype == object:
+        # gemischte Zellen (602 vs. 602.0) erst über ihre Textform unterscheiden
+        col = col.map(str, na_action="ignore")
+    codes, uniques = pd.factorize(col)
+    nummer_u = np.full(len(uniques) + 1, -1, dtype=np.int64)
+    for i, value in enumerate(uniques):
+        nummer = parse(str(value))
+        if nummer is not None and nummer < 2 ** 40:
+            nummer_u[i] = nummer
+
+    codes = np.where(col.notna().to_numpy(), codes, len(uniques))
+    return nummer_u[codes]
+
+def _prefix_lkw(col: pd.Series) -> pd.Series:
+    # "E-<wert>" wie f"E-{x}", leere Zellen bleiben leer
+    codes, uniques = pd.factorize(col.map(str, na_action="ignore") if col.dtype == object else col)
+    labels = np.array([f"E-{u}" for u in uniques] + [np.nan], dtype=object)
+    return pd.Series(labels[codes], index=col.index).where(col.notna(), col)
+
+def apply_rate_table(extracted: pd.DataFrame, table: Optional[RateTable] = None) -> pd.DataFrame:
+    # Zulage je nach Tourdatum aus dem dann gültigen Fuhrpark-Eintrag
+    table = table or current_rate_table()
+    datum = extracted["Datum"]
+    if not pd.api.types.is_datetime64_any_dtype(datum):
+        datum = pd.to_datetime(datum, format=DATUM_FORMAT, errors="coerce")
+    _, zulage_lkw1 = lookup_rates(table, _vehicle_numbers(extracted["LKW1"], _nummer_lkw1), datum)
+    art_lkw, zulage_lkw = lookup_rates(table, _vehicle_numbers(extracted["LKW"], _nummer_lkw), datum)
+
+    # LKW normalisieren + Art bestimmen
+    lkw = extracted["LKW"]
+    extracted["LKW"] = _prefix_lkw(lkw)
+    extracted["Art"] = pd.Series(table.arten[art_lkw], index=extracted.index, dtype=str)
+    extracted["Verdienst"] = zulage_lkw1 + zulage_lkw
+    return extracted
 
 # -------------------------------
 # Personalnummer-Zuordnung
@@ -137,429 +348,2339 @@ def _norm_simple(s: str) -> str:
     s = " ".join(s.split())
     return s
 
-def get_personalnummer(nachname: str, vorname: str) -> str:
-    n_key = _norm_simple(nachname)
-    v_key = _norm_simple(vorname)
-
-    hit = None
-    for ln, inner in name_to_personalnummer.items():
-        if _norm_simple(ln) == n_key:
-            for fn, pn in inner.items():
-                if _norm_simple(fn) == v_key:
-                    return pn
+def build_personalnummer_index(register: dict) -> dict:
+    # Normalisierter Nachname -> (exakte Vornamen, Vornamen in Reihenfolge)
+    index = {}
+    for ln, inner in register.items():
+        n_key = _norm_simple(ln)
+        if n_key in index:
+            continue  # wie bisher zählt nur der erste passende Nachname
+        vornamen = tuple((_norm_simple(fn), pn) for fn, pn in inner.items())
+        exact = {}
+        for f_norm, pn in vornamen:
+            exact.setdefault(f_norm, pn)
+        index[n_key] = (exact, vornamen)
+    return index
+
+def _norm_personalnummer(value) -> str:
+    # 41450 / "41450" / "00041450" -> "00041450"
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text.zfill(8) if text.isdigit() else text
+
+# Mitarbeiterliste (CSV oder Excel) mit Spalten Personalnummer, Nachname, Vorname;
+# fehlt sie, gilt name_to_personalnummer
+PERSONAL_REGISTER_PATH = os.environ.get("ZULAGE_PERSONAL_PATH", str(Path(__file__).with_name("personal.csv")))
+
+class PersonalRegister:
+    # übersetzter Namensindex + Index nach Personalnummer, Abfragen je Register gecacht
+    def __init__(self, register: dict):
+        self.index = build_personalnummer_index(register)
+        self.nummern = {}
+        for ln, inner in register.items():
             for fn, pn in inner.items():
-                f_norm = _norm_simple(fn)
-                if v_key.startswith(f_norm) or f_norm.startswith(v_key) or (f_norm in v_key) or (v_key in f_norm):
+                self.nummern.setdefault(pn, (ln, fn))
+        content = repr(sorted((ln, sorted(inner.items())) for ln, inner in register.items()))
+        self.fingerprint = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        self.lookup = lru_cache(maxsize=4096)(self._lookup)
+
+    def __len__(self) -> int:
+        return len(self.nummern)
+
+    def _lookup(self, nachname: str, vorname: str, personalnummer=None) -> str:
+        # optional zuerst über die Personalnummer (z.B. aus einer Spalte im Export)
+        if personalnummer is not None:
+            pn = _norm_personalnummer(personalnummer)
+            if pn in self.nummern:
+                return pn
+
+        entry = self.index.get(_norm_simple(nachname))
+        if entry is None:
+            return "Unbekannt"
+
+        exact, vornamen = entry
+        v_key = _norm_simple(vorname)
+
+        pn = exact.get(v_key)
+        if pn is not None:
+            return pn
+        for f_norm, pn in vornamen:
+            if v_key.startswith(f_norm) or f_norm.startswith(v_key) or (f_norm in v_key) or (v_key in f_norm):
+                return pn
+        if " " in v_key:
+            first = v_key.split(" ", 1)[0]
+            for f_norm, pn in vornamen:
+                if f_norm.startswith(first):
                     return pn
-            if " " in v_key:
-                first = v_key.split(" ", 1)[0]
-                for fn, pn in inner.items():
-                    if _norm_simple(fn).startswith(first):
-                        return pn
-            hit = "Unbekannt"
-            break
+        return "Unbekannt"
+
+BUILTIN_PERSONAL_REGISTER = PersonalRegister(name_to_personalnummer)
+
+def read_personal_register(path) -> dict:
+    # -> {Nachname: {Vorname: Personalnummer}}, erste Zeile je Name zählt
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm", ".xls"):
+        df = pd.read_excel(path, dtype=str)
+    else:
+        df = pd.read_csv(path, sep=None, engine="python", dtype=str, encoding="utf-8-sig")
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    missing = {"personalnummer", "nachname", "vorname"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{path.name}: Spalten fehlen: {', '.join(sorted(missing))}")
+
+    register = {}
+    for i, (pn, ln, fn) in enumerate(df[["personalnummer", "nachname", "vorname"]].itertuples(index=False), start=2):
+        pn = _norm_personalnummer(pn)
+        ln = "" if pd.isna(ln) else str(ln).strip()
+        fn = "" if pd.isna(fn) else str(fn).strip()
+        if not (pn and ln and fn):
+            if pn or ln or fn:
+                raise ValueError(f"{path.name}, Zeile {i}: Personalnummer, Nachname und Vorname nötig")
+            continue
+        register.setdefault(ln, {}).setdefault(fn, pn)
+    return register
+
+@lru_cache(maxsize=4)
+def load_personal_register(path: str, stamp: tuple) -> PersonalRegister:
+    # stamp = (mtime, Größe): geänderte Datei -> neu einlesen
+    return PersonalRegister(read_personal_register(path))
+
+def current_personal_register(path: str = PERSONAL_REGISTER_PATH) -> PersonalRegister:
+    stamp = file_stamp(path)
+    return BUILTIN_PERSONAL_REGISTER if stamp is None else load_personal_register(str(path), stamp)
+
+def get_personalnummer(nachname: str, vorname: str, personalnummer=None,
+                       register: Optional[PersonalRegister] = None) -> str:
+    return (register or current_personal_register()).lookup(nachname, vorname, personalnummer)
 
-    return hit or "Unbekannt"
+# -------------------------------
+# Einlesen Blatt "Touren"
+# -------------------------------
+# 0=Tour, 3=D Nachname, 4=E Vorname, 6=G Nachname2, 7=H Vorname2,
+# 10=LKW1, 11=LKW, 12=Art, 14=Datum, 16=Q (Ersatz-Tour)
+TOUREN_SPALTEN = {
+    0: "Tour", 3: "Nachname_DE", 4: "Vorname_DE", 6: "Nachname_GH", 7: "Vorname_GH",
+    10: "LKW1", 11: "LKW", 12: "Art", 14: "Datum", 16: "Tour_Q",
+}
+AZ_SPALTE = 13
+AZ_PATTERN = re.compile(r'(?i)\bAZ\b')
+DATUM_FORMAT = "%d.%m.%Y"
+DATUM_AB = pd.Timestamp("2025-01-01")
+
+# "stream": openpyxl read-only, nur benötigte Spalten, Filter schon beim Lesen
+# "pandas": komplettes Blatt per pd.read_excel (Fallback, z.B. für .xls)
+READER_MODE = "stream"
+
+# Texte, die pd.read_excel standardmäßig als leer (NaN) einliest
+_NA_TEXTE = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+def _select_touren_columns(filtered_df: pd.DataFrame) -> pd.DataFrame:
+    spalten = {i: name for i, name in TOUREN_SPALTEN.items() if i < filtered_df.shape[1]}
+    touren = filtered_df.iloc[:, list(spalten)].copy()
+    touren.columns = list(spalten.values())
+    return touren
+
+def _read_touren_pandas(source) -> pd.DataFrame:
+    df = pd.read_excel(source, sheet_name="Touren", header=0)
+
+    # AZ-Zeilen filtern (Spalte 14 -> Index 13)
+    mask = df.iloc[:, AZ_SPALTE].astype(str).str.contains(AZ_PATTERN, na=False)
+    filtered_df = df[mask]
+
+    if not filtered_df.empty:
+        datum = pd.to_datetime(filtered_df.iloc[:, 14], format=DATUM_FORMAT, errors="coerce")
+        filtered_df = filtered_df[datum >= DATUM_AB]
+
+    return _select_touren_columns(filtered_df)
+
+def _convert_cell(cell):
+    # wie der openpyxl-Reader von pandas: leer -> "", ganze Zahlen -> int
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n":
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+def _value_class(value) -> str:
+    # grobe Klasse einer Zelle, die über den Spaltentyp von pd.read_excel entscheidet
+    if isinstance(value, str):
+        if value in _NA_TEXTE:
+            return "na"
+        try:
+            number = float(value)
+        except ValueError:
+            return "text"
+        return "int_text" if number.is_integer() else "float_text"
+    if isinstance(value, float) and value != value:
+        return "na"
+    return type(value).__name__
+
+@lru_cache(maxsize=4096, typed=True)
+def _datum_im_zeitraum(value) -> bool:
+    datum = pd.to_datetime(pd.Series([value], dtype=object), format=DATUM_FORMAT, errors="coerce").iloc[0]
+    return bool(datum >= DATUM_AB)
+
+def _touren_indices() -> list:
+    # Q (Ersatz-Tour) zuletzt, damit die Spalte wegfallen kann, wenn das Blatt schmaler ist
+    return [i for i in TOUREN_SPALTEN if i != 16] + [16]
+
+def _iter_touren_rows(source, indices: list):
+    # (Zeilennummer, Werte der Spalten indices, AZ-Wert, belegte Breite) je Zeile inkl. Kopfzeile
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        if "Touren" not in wb.sheetnames:
+            raise ValueError("Worksheet named 'Touren' not found")
+        sheet = wb["Touren"]
+        sheet.reset_dimensions()
+
+        # Spalten hinter Q werden nie gebraucht und gar nicht erst als Zellen angelegt
+        for row_number, row in enumerate(sheet.iter_rows(max_col=17)):
+            width = len(row)
+            while width and row[width - 1].value in (None, ""):
+                width -= 1
+            if row_number == 0:
+                yield row_number, None, None, width
+                continue
+            values = [_convert_cell(row[i]) if i < width else "" for i in indices]
+            az = _convert_cell(row[AZ_SPALTE]) if AZ_SPALTE < width else ""
+            yield row_number, values, az, width
+    finally:
+        wb.close()
+
+class _Witnesses:
+    # je Spalte ein Beispielwert pro Klasse, damit die Spaltentypen wie bei
+    # pd.read_excel über das ganze Blatt bestimmt werden
+    def __init__(self, indices: list):
+        self.indices = indices
+        self.values = {i: {} for i in indices}
+        self.text_classes = {i: {} for i in indices}
+
+    def add(self, values: list) -> None:
+        for i, value in zip(self.indices, values):
+            if isinstance(value, str):
+                cls = self.text_classes[i].get(value)
+                if cls is None:
+                    cls = self.text_classes[i][value] = _value_class(value)
+            else:
+                cls = _value_class(value)
+            self.values[i].setdefault(cls, value)
+
+    def rows(self) -> list:
+        spalten = [list(self.values[i].values()) for i in self.indices]
+        n_witness = max(len(w) for w in spalten)
+        return [[w[k] if k < len(w) else w[0] for w in spalten] for k in range(n_witness)]
+
+def _keep_touren_row(values: list, az, datum_pos: int) -> bool:
+    return isinstance(az, str) and bool(AZ_PATTERN.search(az)) and _datum_im_zeitraum(values[datum_pos])
+
+def _touren_frame(rows: list, index: list, witness_rows: list, indices: list, max_width: int) -> pd.DataFrame:
+    if max_width <= 14:
+        raise IndexError("Blatt 'Touren' hat zu wenige Spalten")
+
+    if not rows and not witness_rows:
+        return pd.DataFrame(columns=list(TOUREN_SPALTEN.values()))
+
+    # ohne passende Zeilen trotzdem über die Beispielwerte parsen: Spaltentypen wie bei read_excel
+    parsed = pd.io.parsers.TextParser(witness_rows + rows, header=None).read()
+    touren = parsed.iloc[len(witness_rows):].copy()
+    touren.index = pd.Index(index, dtype=np.int64)
+    touren.columns = [TOUREN_SPALTEN[i] for i in indices]
+    if max_width <= 16:
+        touren = touren.drop(columns="Tour_Q")
+
+    # gleiche Datumsgrenze wie im pandas-Pfad, auf den eingelesenen Werten
+    datum = pd.to_datetime(touren["Datum"], format=DATUM_FORMAT, errors="coerce")
+    return touren[datum >= DATUM_AB]
+
+def _read_touren_stream(source) -> pd.DataFrame:
+    indices = _touren_indices()
+    datum_pos = indices.index(14)
+    witnesses = _Witnesses(indices)
+    kept_rows, kept_index = [], []
+    max_width = 0
+
+    for row_number, values, az, width in _iter_touren_rows(source, indices):
+        max_width = max(max_width, width)
+        if row_number == 0:
+            continue
+        witnesses.add(values)
+        if _keep_touren_row(values, az, datum_pos):
+            kept_rows.append(values)
+            kept_index.append(row_number - 1)
+
+    return _touren_frame(kept_rows, kept_index, witnesses.rows(), indices, max_width)
+
+def iter_touren_chunks(source, chunk_rows: int):
+    # wie _read_touren_stream, aber in Blöcken zu höchstens chunk_rows AZ-Zeilen.
+    # 1. Durchlauf: nur Spaltentypen und Breite (ohne Zeilen zu behalten),
+    # 2. Durchlauf: Blöcke mit denselben Typen wie beim Einlesen am Stück.
+    # Das Blatt wird also zweimal komplett geparst: weniger Speicher, etwas mehr Zeit.
+    indices = _touren_indices()
+    datum_pos = indices.index(14)
+    witnesses = _Witnesses(indices)
+    max_width = 0
+    if hasattr(source, "seek"):
+        source.seek(0)
+    for row_number, values, _, width in _iter_touren_rows(source, indices):
+        max_width = max(max_width, width)
+        if row_number:
+            witnesses.add(values)
+    witness_rows = witnesses.rows() if max_width > 14 else []
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    kept_rows, kept_index = [], []
+    for row_number, values, az, _ in _iter_touren_rows(source, indices):
+        if row_number and _keep_touren_row(values, az, datum_pos):
+            kept_rows.append(values)
+            kept_index.append(row_number - 1)
+            if len(kept_rows) >= chunk_rows:
+                yield _touren_frame(kept_rows, kept_index, witness_rows, indices, max_width)
+                kept_rows, kept_index = [], []
+    if kept_rows or max_width <= 14:
+        yield _touren_frame(kept_rows, kept_index, witness_rows, indices, max_width)
+
+def read_touren(source, mode: str = READER_MODE) -> pd.DataFrame:
+    # AZ-Zeilen ab DATUM_AB mit den Spalten aus TOUREN_SPALTEN,
+    # Index = Zeilennummer wie bei pd.read_excel
+    name = str(getattr(source, "name", source)).lower()
+    if mode == "pandas" or name.endswith(".xls"):
+        return _read_touren_pandas(source)
+    return _read_touren_stream(source)
 
 # -------------------------------
-# Styling
+# Namensauflösung (spaltenweise)
 # -------------------------------
-def apply_styles(sheet):
-    header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-    name_header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    subheader_fill = PatternFill(start_color="D9E2F3", end_color="D9E2F3", fill_type="solid")
-    data_fill_white = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-    data_fill_light = PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")
-    total_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-
-    thin_border = Border(
-        left=Side(style='thin', color='CCCCCC'),
-        right=Side(style='thin', color='CCCCCC'),
-        top=Side(style='thin', color='CCCCCC'),
-        bottom=Side(style='thin', color='CCCCCC')
-    )
-    medium_border = Border(
-        left=Side(style='medium', color='1F4E78'),
-        right=Side(style='medium', color='1F4E78'),
-        top=Side(style='medium', color='1F4E78'),
-        bottom=Side(style='medium', color='1F4E78')
-    )
+NAME_COLUMNS = ["Nachname_DE", "Vorname_DE", "Nachname_GH", "Vorname_GH"]
+
+def _clean_name_column(col: pd.Series) -> pd.Series:
+    # wie früher pro Zelle: NaN -> "", NBSP -> Space, trimmen
+    missing = col.isna()
+    cleaned = col.astype(object).where(~missing, "").astype(str)
+    cleaned = cleaned.str.replace("\u00a0", " ", regex=False).str.strip()
+    return cleaned.where(~missing, "")
+
+def resolve_driver_names(tmp: pd.DataFrame) -> pd.DataFrame:
+    # - Wenn D und E voll -> D/E verwenden
+    # - sonst G/H verwenden (NICHT beide nehmen)
+    # - Wenn auch G/H leer ist -> Zeile verwerfen
+    cleaned = {c: _clean_name_column(tmp[c]) for c in NAME_COLUMNS}
+
+    de_ok = (cleaned["Nachname_DE"] != "") & (cleaned["Vorname_DE"] != "")
+    nachname = cleaned["Nachname_DE"].where(de_ok, cleaned["Nachname_GH"])
+    vorname = cleaned["Vorname_DE"].where(de_ok, cleaned["Vorname_GH"])
+    keep = ((nachname != "") & (vorname != "")).to_numpy()
+
+    if not keep.any():
+        return pd.DataFrame()
+
+    extracted = pd.DataFrame({
+        "Tour": tmp["Tour"].to_numpy()[keep],
+        "Nachname": nachname.to_numpy()[keep],
+        "Vorname": vorname.to_numpy()[keep],
+        "LKW1": tmp["LKW1"].to_numpy()[keep],
+        "LKW": tmp["LKW"].to_numpy()[keep],
+        "Art": tmp["Art"].to_numpy()[keep],
+        "Datum": tmp["Datum"].to_numpy()[keep],
+    })
+    # optional, wenn TOUREN_SPALTEN eine Spalte "Personalnummer" enthält
+    if "Personalnummer" in tmp.columns:
+        extracted["Personalnummer"] = tmp["Personalnummer"].to_numpy()[keep]
+    # Ersatz-Tour aus Spalte Q derselben Zeile (finalize_tours füllt damit und entfernt sie)
+    if "Tour_Q" in tmp.columns:
+        extracted["Tour_Q"] = tmp["Tour_Q"].to_numpy()[keep]
+    return extracted
 
-    is_first_in_block = True
-    alternate_row = False
-
-    for row_idx, row in enumerate(sheet.iter_rows(min_col=1, max_col=5), start=1):
-        first_cell_value = str(row[0].value).strip() if row[0].value else ""
-
-        if "Gesamtverdienst" in first_cell_value:
-            for cell in row:
-                cell.fill = total_fill
-                cell.font = Font(bold=True, size=11, color="FFFFFF")
-                cell.alignment = Alignment(horizontal="right", vertical="center")
-                cell.border = medium_border
-                if cell.column == 5:
-                    cell.number_format = '#,##0.00 €'
-            is_first_in_block = True
-            alternate_row = False
-
-        elif is_first_in_block and first_cell_value:
-            for cell in row:
-                cell.fill = name_header_fill
-                cell.font = Font(bold=True, size=13, color="FFFFFF")
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = medium_border
-            is_first_in_block = False
-            alternate_row = False
-
-        elif first_cell_value and not any(char.isdigit() for char in first_cell_value[:10]):
-            if any(keyword in first_cell_value for keyword in ["Datum", "Tour", "LKW", "Art", "Verdienst"]):
-                for cell in row:
-                    cell.fill = subheader_fill
-                    cell.font = Font(bold=True, size=10, color="1F4E78")
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                    cell.border = thin_border
-                alternate_row = False
+# -------------------------------
+# Diagnose: Laufzeit je Stufe, Datei und Monatsblatt
+# -------------------------------
+def _rss_mb() -> Optional[float]:
+    # aktueller Speicher des Prozesses (Linux), sonst Höchststand, sonst unbekannt
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, AttributeError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class Diagnostics:
+    # sammelt je Stufe: Laufzeit, Zeilen, Speicher (+ Datei / Monatsblatt)
+    def __init__(self):
+        self.records = []
+        self.meta = {}
+
+    @contextmanager
+    def stage(self, stage: str, **info):
+        record = {"stage": stage, **info}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            record["rss_mb"] = _rss_mb()
+            self.records.append(record)
+
+    def extend(self, records) -> None:
+        self.records.extend(records)
+
+    def summary(self) -> pd.DataFrame:
+        if not self.records:
+            return pd.DataFrame(columns=["stage", "count", "seconds", "rows", "max_rss_mb"])
+        df = pd.DataFrame(self.records)
+        if "rows" not in df:
+            df["rows"] = np.nan
+        return (df.groupby("stage", sort=False)
+                  .agg(count=("seconds", "size"), seconds=("seconds", "sum"), rows=("rows", "sum"),
+                       max_rss_mb=("rss_mb", "max"))
+                  .reset_index())
+
+    def to_json(self) -> str:
+        return json.dumps({"records": self.records, **self.meta}, ensure_ascii=False, indent=1, default=str)
+
+def profile_stats_text(profiler: cProfile.Profile, limit: int = 30) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+def profile_dump(profiler: cProfile.Profile) -> bytes:
+    # .prof-Datei für snakeviz / pstats; dump_stats schreibt nur in Dateien
+    fd, name = tempfile.mkstemp(prefix="zulage_", suffix=".prof")
+    os.close(fd)
+    path = Path(name)
+    try:
+        profiler.dump_stats(str(path))
+        return path.read_bytes()
+    finally:
+        path.unlink(missing_ok=True)
+
+# -------------------------------
+# Einlesen je Datei (optional parallel)
+# -------------------------------
+# Anzahl Worker-Prozesse für mehrere Dateien (None = Anzahl CPUs, 1 = ohne Prozesse)
+INGEST_WORKERS = None
+
+class FileResult(NamedTuple):
+    name: str
+    data: Optional[pd.DataFrame]
+    messages: list  # [(level, text)], level: "warning" / "error"
+    stages: list = []  # Diagnose-Einträge aus extract_file
+
+def finalize_tours(extracted: pd.DataFrame) -> pd.DataFrame:
+    extracted["Datum"] = pd.to_datetime(extracted["Datum"], format="%d.%m.%Y", errors="coerce")
+
+    # Tour ggf. aus Spalte Q (Index 16) derselben Zeile; bis PARSE_VERSION 2 wurde nach
+    # Index ausgerichtet und damit aus einer fremden Zeile des Blatts gefüllt
+    if "Tour_Q" in extracted.columns:
+        extracted["Tour"] = extracted["Tour"].fillna(extracted.pop("Tour_Q"))
+
+    extracted["Monat"] = extracted["Datum"].dt.month
+    extracted["Jahr"] = extracted["Datum"].dt.year
+    return extracted
+
+# -------------------------------
+# Kompakte Spaltentypen
+# -------------------------------
+# Namen/LKW/Art als Kategorien, Zahlen so klein wie möglich (Summen rechnet pandas in int64)
+CATEGORY_COLUMNS = ["Nachname", "Vorname", "LKW", "Art"]
+SMALL_INT_COLUMNS = ["Verdienst", "Monat", "Jahr", "Touren"]
+# Rang von (Nachname, Vorname): nach "Fahrer" sortieren = nach Nachname, Vorname sortieren
+DRIVER_KEY = "Fahrer"
+
+def driver_keys(data: pd.DataFrame) -> np.ndarray:
+    if DRIVER_KEY in data.columns:
+        return data[DRIVER_KEY].to_numpy()
+    return data.groupby(["Nachname", "Vorname"], sort=True, observed=True).ngroup().to_numpy(dtype=np.int32)
+
+def compact_tours(data: pd.DataFrame) -> pd.DataFrame:
+    # auch nach concat aufrufen: unterschiedliche Kategorien werden dort wieder zu Strings,
+    # und der Fahrer-Schlüssel gilt nur innerhalb eines Frames
+    if data.empty:
+        return data
+    data = data.copy(deep=False)
+    for column in CATEGORY_COLUMNS:
+        if column in data.columns and not isinstance(data[column].dtype, pd.CategoricalDtype):
+            data[column] = data[column].astype("category")
+    for column in SMALL_INT_COLUMNS:
+        if column in data.columns and pd.api.types.is_integer_dtype(data[column]):
+            data[column] = pd.to_numeric(data[column], downcast="integer")
+    data = data.drop(columns=DRIVER_KEY, errors="ignore")
+    data[DRIVER_KEY] = driver_keys(data)
+    return data
+
+def extract_file(source, name: str, table: Optional[RateTable] = None) -> FileResult:
+    diagnostics = Diagnostics()
+    try:
+        with diagnostics.stage("read", file=name) as record:
+            touren = read_touren(source)
+            record["rows"] = len(touren)
+
+        if touren.empty:
+            return FileResult(name, None, [("warning", f"Keine passenden Daten in der Datei {name} gefunden.")],
+                              diagnostics.records)
+
+        # ------------------------------------------------------------
+        # NAMENLOGIK (wie gewünscht):
+        # - Wenn D und E voll -> D/E verwenden
+        # - Wenn D und E leer -> G/H verwenden
+        # - NICHT beide nehmen
+        # ------------------------------------------------------------
+        with diagnostics.stage("names", file=name) as record:
+            extracted = resolve_driver_names(touren)
+            record["rows"] = len(extracted)
+
+        if extracted.empty:
+            return FileResult(name, None, [("warning", f"AZ gefunden, aber keine verwertbaren Namen (D/E oder G/H) in {name}.")],
+                              diagnostics.records)
+
+        # Datum zuerst, die Zulage hängt vom Tourdatum ab; dann LKW normalisieren,
+        # Art + Verdienst aus dem Fuhrpark
+        with diagnostics.stage("earnings", file=name, rows=len(extracted)):
+            extracted = finalize_tours(extracted)
+            extracted = apply_rate_table(extracted, table)
+        with diagnostics.stage("compact", file=name, rows=len(extracted)):
+            extracted = compact_tours(extracted)
+
+        return FileResult(name, extracted, [], diagnostics.records)
+
+    except Exception as e:
+        return FileResult(name, None, [("error", f"Fehler beim Einlesen der Datei {name}: {e}")], diagnostics.records)
+
+# Blockweise einlesen: AZ-Zeilen je Block (None = Blatt am Stück)
+CHUNK_ROWS = None
+DEFAULT_CHUNK_ROWS = 50_000
+
+def is_month_totals(all_data: pd.DataFrame) -> bool:
+    # Teilsummen (aggregation_cube) statt einzelner Touren
+    return "Touren" in all_data.columns and "Datum" not in all_data.columns
+
+def extract_file_chunked(source, name: str, table: Optional[RateTable] = None,
+                         chunk_rows: int = DEFAULT_CHUNK_ROWS, totals_only: bool = False) -> FileResult:
+    # wie extract_file, aber Blatt blockweise: je Block Filter, Namen, Zulage; behalten werden
+    # nur die fertigen Touren (oder mit totals_only nur die Teilsummen je Monat und Fahrer)
+    name_lower = str(getattr(source, "name", name)).lower()
+    if READER_MODE == "pandas" or name_lower.endswith(".xls"):
+        # .xls nur am Stück lesbar
+        result = extract_file(source, name, table)
+        if totals_only and result.data is not None:
+            result = FileResult(result.name, aggregation_cube(result.data), result.messages, result.stages)
+        return result
+
+    diagnostics = Diagnostics()
+    table = table or current_rate_table()
+    parts = []
+    read_rows = 0
+    try:
+        chunks = iter_touren_chunks(source, chunk_rows)
+        while True:
+            with diagnostics.stage("read", file=name) as record:
+                touren = next(chunks, None)
+                record["rows"] = 0 if touren is None else len(touren)
+            if touren is None:
+                break
+            read_rows += len(touren)
+
+            with diagnostics.stage("names", file=name) as record:
+                extracted = resolve_driver_names(touren)
+                record["rows"] = len(extracted)
+            del touren
+            if extracted.empty:
+                continue
+
+            with diagnostics.stage("earnings", file=name, rows=len(extracted)):
+                extracted = finalize_tours(extracted)
+                extracted = apply_rate_table(extracted, table)
+            parts.append(aggregation_cube(extracted) if totals_only else extracted)
+
+        if not read_rows:
+            return FileResult(name, None, [("warning", f"Keine passenden Daten in der Datei {name} gefunden.")],
+                              diagnostics.records)
+        if not parts:
+            return FileResult(name, None, [("warning", f"AZ gefunden, aber keine verwertbaren Namen (D/E oder G/H) in {name}.")],
+                              diagnostics.records)
+        data = pd.concat(parts, ignore_index=True)
+        data = aggregation_cube(data) if totals_only else compact_tours(data)
+        return FileResult(name, data, [], diagnostics.records)
+
+    except Exception as e:
+        return FileResult(name, None, [("error", f"Fehler beim Einlesen der Datei {name}: {e}")], diagnostics.records)
+
+def extract_file_bytes(name: str, data: bytes, table: Optional[RateTable] = None,
+                       chunk_rows: Optional[int] = None, totals_only: bool = False) -> FileResult:
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    if chunk_rows or totals_only:
+        return extract_file_chunked(buffer, name, table, chunk_rows or DEFAULT_CHUNK_ROWS, totals_only)
+    return extract_file(buffer, name, table)
+
+def _pipeline_module():
+    # Streamlit führt das Skript als "__main__" aus, Worker-Prozesse brauchen
+    # die Funktionen aber aus einem importierbaren Modul
+    if __name__ != "__main__":
+        return sys.modules[__name__]
+    return importlib.import_module(Path(__file__).stem)
+
+# -------------------------------
+# Cache für eingelesene Dateien (Hash des Inhalts)
+# -------------------------------
+# bei jeder Änderung an Einlese-/Berechnungsregeln hochzählen
+PARSE_VERSION = 3
+
+UPLOAD_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# optionaler Festplatten-Cache, z.B. ZULAGE_CACHE_DIR=/var/cache/zulage
+UPLOAD_CACHE_DIR = os.environ.get("ZULAGE_CACHE_DIR")
+UPLOAD_CACHE_MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+
+def _parse_rules_fingerprint(table: RateTable) -> str:
+    rules = repr((PARSE_VERSION, table.fingerprint,
+                  sorted(TOUREN_SPALTEN.items()), AZ_PATTERN.pattern, DATUM_FORMAT, str(DATUM_AB)))
+    return hashlib.sha256(rules.encode("utf-8")).hexdigest()[:16]
+
+def upload_cache_key(data: bytes, table: Optional[RateTable] = None, totals_only: bool = False) -> str:
+    key = f"{hashlib.sha256(data).hexdigest()}-{_parse_rules_fingerprint(table or current_rate_table())}"
+    # Teilsummen sind kein Ersatz für die Touren, eigener Schlüssel
+    return f"{key}-summen" if totals_only else key
+
+def _result_size(result: FileResult) -> int:
+    if result.data is None:
+        return 1024
+    return int(result.data.memory_usage(deep=True).sum())
+
+class UploadCache:
+    # LRU im Speicher, optional zusätzlich Parquet-Dateien (gemischte Spalten als Text + Typ, _encode_mixed)
+    def __init__(self, max_bytes: int = UPLOAD_CACHE_MAX_BYTES, directory: Optional[str] = UPLOAD_CACHE_DIR,
+                 max_disk_bytes: int = UPLOAD_CACHE_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (FileResult, Größe)
+        self._size = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[FileResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+        result = self._read_disk(key)
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: FileResult) -> None:
+        self._remember(key, result)
+        self._write_disk(key, result)
+
+    def _remember(self, key: str, result: FileResult) -> None:
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (result, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def _read_disk(self, key: str) -> Optional[FileResult]:
+        if not self.directory:
+            return None
+        meta_path = self.directory / f"{key}.json"
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            data = None
+            if meta["format"] == "parquet":
+                data = _decode_mixed(pd.read_parquet(self.directory / f"{key}.parquet"), meta["mixed"])
+            elif meta["format"] is not None:
+                # z. B. alte Pickle-Einträge: nicht laden, Datei wird neu eingelesen
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        meta_path.touch()
+        return FileResult(meta["name"], data, [tuple(m) for m in meta["messages"]])
+
+    def _write_disk(self, key: str, result: FileResult) -> None:
+        if not self.directory:
+            return
+        fmt, mixed = None, []
+        if result.data is not None:
+            try:
+                data, mixed = _encode_mixed(result.data)
+                data.to_parquet(self.directory / f"{key}.parquet", index=False)
+                fmt = "parquet"
+            except (ImportError, ValueError, TypeError):
+                # pyarrow fehlt oder Werte ohne Textform: nur im Speicher cachen
+                (self.directory / f"{key}.parquet").unlink(missing_ok=True)
+                return
+        meta = {"name": result.name, "format": fmt, "mixed": mixed, "messages": result.messages}
+        (self.directory / f"{key}.json").write_text(json.dumps(meta), encoding="utf-8")
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        metas = sorted(self.directory.glob("*.json"), key=lambda f: f.stat().st_mtime)
+        files = {m: list(self.directory.glob(f"{m.stem}.*")) for m in metas}
+        total = sum(f.stat().st_size for group in files.values() for f in group)
+        for meta_path in metas:
+            if total <= self.max_disk_bytes:
+                break
+            for f in files[meta_path]:
+                total -= f.stat().st_size
+                f.unlink(missing_ok=True)
+
+# Python-Typ je Zelle gemischter Spalten (Tour 1234 / 1234.0 / "Q12"), "" = None; NaN ist "f"
+_MIXED_TYPES = {int: "i", float: "f", str: "s", bool: "b"}
+_MIXED_PARSE = {"i": int, "f": float, "s": str, "b": lambda text: text == "True"}
+MIXED_MARKER = "{}__typ"
+
+def _encode_mixed(data: pd.DataFrame) -> tuple:
+    # Parquet braucht einen Typ je Spalte: Objekt-Spalten mit Nicht-Text als Text + Typ-Spalte,
+    # damit 1234 und 1234.0 beim Lesen wieder unterscheidbar sind (Anzeige in der Mappe)
+    data = data.copy(deep=False)
+    mixed = []
+    for column in data.columns:
+        if data[column].dtype != object:
+            continue
+        values = [v.item() if isinstance(v, np.generic) else v for v in data[column].to_numpy()]
+        # KeyError bei anderen Typen (z.B. Datum in einer Text-Spalte) -> TypeError, kein Parquet
+        try:
+            types = ["" if v is None else _MIXED_TYPES[type(v)] for v in values]
+        except KeyError as e:
+            raise TypeError(f"Spalte {column}: Typ {e} nicht als Text speicherbar") from None
+        if all(t in ("s", "") for t in types):
+            continue
+        data[column] = np.array(["" if t == "" else str(v) for v, t in zip(values, types)], dtype=object)
+        data[MIXED_MARKER.format(column)] = np.array(types, dtype=object)
+        mixed.append(column)
+    return data, mixed
+
+def _decode_mixed(data: pd.DataFrame, mixed: list) -> pd.DataFrame:
+    for column in mixed:
+        marker = data.pop(MIXED_MARKER.format(column))
+        data[column] = np.array([None if t == "" else _MIXED_PARSE[t](v)
+                                 for v, t in zip(data[column].to_numpy(), marker.to_numpy())], dtype=object)
+    return data
+
+def _renamed(result: FileResult, name: str) -> FileResult:
+    # gleicher Inhalt unter anderem Dateinamen hochgeladen
+    if result.name == name:
+        return result
+    messages = [(level, text.replace(result.name, name)) for level, text in result.messages]
+    return FileResult(name, result.data, messages, result.stages)
+
+def ingest_files(files: list, workers: Optional[int] = INGEST_WORKERS,
+                 cache: Optional[UploadCache] = None, diagnostics: Optional[Diagnostics] = None,
+                 table: Optional[RateTable] = None, chunk_rows: Optional[int] = CHUNK_ROWS,
+                 totals_only: bool = False, progress=None, keys: Optional[list] = None) -> list:
+    # files: [(name, bytes)] -> [FileResult] in derselben Reihenfolge.
+    # keys: schon berechnete upload_cache_key je Datei (gleiche table/totals_only), spart das Hashen
+    # chunk_rows: blockweise einlesen (gleiches Ergebnis, weniger Speicher),
+    # totals_only: nur Teilsummen je Monat und Fahrer behalten (reicht für die Übersicht),
+    # progress(fertig, gesamt, name) nach jeder Datei, darf mit JobCancelled abbrechen
+    diagnostics = diagnostics or Diagnostics()
+    table = table or current_rate_table()
+    progress = progress or _no_progress
+    done = 0
+    with diagnostics.stage("ingest", files=len(files), chunk_rows=chunk_rows) as total:
+        if not cache:
+            keys = [None] * len(files)
+        elif keys is None:
+            keys = [upload_cache_key(data, table, totals_only) for _, data in files]
+        results = [None] * len(files)
+        todo = []
+        for i, ((name, data), key) in enumerate(zip(files, keys)):
+            hit = None
+            if cache:
+                with diagnostics.stage("cache", file=name) as record:
+                    hit = cache.get(key)
+                    record["hit"] = hit is not None
+            if hit is not None:
+                results[i] = _renamed(hit, name)
+                done += 1
+                progress(done, len(files), name)
             else:
-                for cell in row:
-                    cell.fill = name_header_fill
-                    cell.font = Font(bold=True, size=11, color="FFFFFF")
-                    cell.alignment = Alignment(horizontal="left", vertical="center")
-                    cell.border = thin_border
+                todo.append(i)
+
+        extracted = _extract_all([files[i] for i in todo], workers, table, chunk_rows, totals_only)
+        with closing(extracted):
+            for i, result in zip(todo, extracted):
+                results[i] = result
+                diagnostics.extend(result.stages)
+                # Fehler nicht merken, die können am Upload oder an der Umgebung liegen
+                if cache and not any(level == "error" for level, _ in result.messages):
+                    cache.put(keys[i], result)
+                done += 1
+                progress(done, len(files), files[i][0])
+        total["rows"] = sum(len(r.data) for r in results if r.data is not None)
+    return results
+
+def _no_progress(done: int, total: int, name: str = "") -> None:
+    pass
+
+def _extract_all(files: list, workers: Optional[int], table: RateTable,
+                 chunk_rows: Optional[int] = None, totals_only: bool = False):
+    # liefert die Ergebnisse der Reihe nach, sobald sie fertig sind (Fortschritt, Abbruch)
+    if not files:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        for name, data in files:
+            yield extract_file_bytes(name, data, table, chunk_rows, totals_only)
+        return
+
+    module = _pipeline_module()
+    # Tabelle als Klasse des importierbaren Moduls, sonst scheitert das Pickle unter Streamlit
+    table = module.RateTable(*table)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(module.extract_file_bytes, name, data, table, chunk_rows, totals_only)
+                   for name, data in files]
+        for (name, _), future in zip(files, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = FileResult(name, None, [("error", f"Fehler beim Einlesen der Datei {name}: {e}")])
+            yield result
+    finally:
+        # bei Abbruch keine weiteren Dateien mehr anfangen und nicht auf laufende warten
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# -------------------------------
+# Tourenspeicher (SQLite)
+# -------------------------------
+TOUR_STORE_PATH = os.environ.get("ZULAGE_STORE_PATH", "zulage_touren.sqlite")
+
+STORE_COLUMNS = ["Tour", "Nachname", "Vorname", "LKW1", "LKW", "Art", "Datum", "Verdienst", "Monat", "Jahr"]
+
+def _canonical(value) -> str:
+    # gleiche Tour/LKW aus verschiedenen Exporten gleich schreiben (1234 / 1234.0 / " 1234")
+    value = _cell_value(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text[:-2] if text.endswith(".0") and text[:-2].lstrip("E-").isdigit() else text
+
+def _canonical_column(col: pd.Series) -> np.ndarray:
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype(object)
+    codes, uniques = pd.factorize(col.map(str, na_action="ignore") if col.dtype == object else col)
+    canon = np.array([_canonical(u) for u in uniques] + [""], dtype=object)
+    return canon[codes]
+
+def tour_fingerprints(extracted: pd.DataFrame) -> pd.Series:
+    # (Tour, Datum, Fahrer, LKW) + laufende Nummer gleicher Zeilen innerhalb eines Uploads:
+    # derselbe Export zweimal (oder Wochen- und Monatsdatei) zählt jede Tour nur einmal,
+    # echte Doppelzeilen in einer Datei bleiben erhalten
+    key = pd.Series(_canonical_column(extracted["Tour"]), index=extracted.index)
+    key = key + "|" + extracted["Datum"].dt.strftime("%Y-%m-%d").fillna("")
+    key = (key + "|" + extracted["Nachname"].astype(object).map(_norm_simple)
+           + "|" + extracted["Vorname"].astype(object).map(_norm_simple))
+    key = key + "|" + pd.Series(_canonical_column(extracted["LKW"]), index=extracted.index)
+    key = key + "|" + key.groupby(key).cumcount().astype(str)
+    return key.map(lambda k: hashlib.blake2b(k.encode("utf-8"), digest_size=16).hexdigest())
+
+class TourStore:
+    def __init__(self, path: str = TOUR_STORE_PATH):
+        self.path = path
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            # Tour und LKW1 ohne Typ: SQLite behält int/float/text wie eingelesen
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS touren (
+                    fingerprint TEXT PRIMARY KEY,
+                    jahr INTEGER NOT NULL,
+                    monat INTEGER NOT NULL,
+                    datum TEXT,
+                    tour,
+                    nachname TEXT,
+                    vorname TEXT,
+                    lkw1,
+                    lkw TEXT,
+                    art TEXT,
+                    verdienst INTEGER,
+                    quelle TEXT,
+                    eingelesen_am TEXT
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS touren_monat ON touren (jahr, monat)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, extracted: pd.DataFrame, quelle: str = "") -> int:
+        # fügt nur noch unbekannte Touren ein, gibt die Anzahl neuer Zeilen zurück
+        if extracted.empty:
+            return 0
+        fingerprints = tour_fingerprints(extracted)
+        eingelesen_am = pd.Timestamp.now().isoformat(timespec="seconds")
+        datum = extracted["Datum"].dt.strftime("%Y-%m-%d")
+        records = [
+            (fp, int(jahr), int(monat), _db_value(d), _db_value(tour), nn, vn,
+             _db_value(lkw1), _db_value(lkw), _db_value(art), int(verdienst), quelle, eingelesen_am)
+            for fp, jahr, monat, d, tour, nn, vn, lkw1, lkw, art, verdienst in zip(
+                fingerprints, extracted["Jahr"], extracted["Monat"], datum, extracted["Tour"],
+                extracted["Nachname"], extracted["Vorname"], extracted["LKW1"], extracted["LKW"],
+                extracted["Art"], extracted["Verdienst"],
+            )
+        ]
+        with closing(self._connect()) as con, con:
+            before = con.total_changes
+            con.executemany("INSERT OR IGNORE INTO touren VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
+            return con.total_changes - before
+
+    def months(self) -> list:
+        with closing(self._connect()) as con:
+            return [tuple(r) for r in con.execute("SELECT DISTINCT jahr, monat FROM touren ORDER BY jahr, monat")]
+
+    def load(self, von: Optional[tuple] = None, bis: Optional[tuple] = None,
+             table: Optional[RateTable] = None) -> pd.DataFrame:
+        # Touren von (Jahr, Monat) bis (Jahr, Monat) einschließlich, in Einfüge-Reihenfolge.
+        # Art und Verdienst neu aus dem aktuellen Fuhrpark (auch rückwirkende gueltig_ab),
+        # die gespeicherten Werte gelten nur für den Stand beim Einlesen
+        von = von or (0, 0)
+        bis = bis or (9999, 12)
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                "SELECT tour, nachname, vorname, lkw1, lkw, art, datum, verdienst, monat, jahr FROM touren "
+                "WHERE (jahr, monat) >= (?, ?) AND (jahr, monat) <= (?, ?) ORDER BY rowid",
+                (*von, *bis),
+            ).fetchall()
+        columns = list(zip(*rows)) if rows else [()] * len(STORE_COLUMNS)
+        # LKW1 mit den gespeicherten Typen: 602 und 602.0 zählen verschieden (wie beim Einlesen)
+        data = pd.DataFrame({name: pd.Series(values, dtype=object if name == "LKW1" else None)
+                             for name, values in zip(STORE_COLUMNS, columns)})
+        data["Datum"] = pd.to_datetime(data["Datum"], format="%Y-%m-%d")
+        if data.empty:
+            return data
+        # gespeichert ist "E-<wert>", apply_rate_table setzt das Präfix wieder
+        data["LKW"] = data["LKW"].astype(object).str.removeprefix("E-")
+        return compact_tours(apply_rate_table(data, table))
+
+def _db_value(value):
+    value = _cell_value(value)
+    return None if value == "" else value
 
+# -------------------------------
+# Styling
+# -------------------------------
+_THIN = ("thin", "CCCCCC")
+_MEDIUM = ("medium", "1F4E78")
+_EURO = '#,##0.00 €'
+
+# Gemeinsame Stile für beide Export-Engines (Farben ohne Alpha)
+STYLE_SPECS = {
+    # Monatsblatt, Spalten A-E
+    "total": dict(fill="70AD47", bold=True, size=11, color="FFFFFF", align="right", border=_MEDIUM),
+    "total_eur": dict(fill="70AD47", bold=True, size=11, color="FFFFFF", align="right", border=_MEDIUM, num_format=_EURO),
+    "name": dict(fill="4472C4", bold=True, size=13, color="FFFFFF", align="center", border=_MEDIUM),
+    "sub": dict(fill="D9E2F3", bold=True, size=10, color="1F4E78", align="center", border=_THIN),
+    "data_white": dict(fill="FFFFFF", size=10, color="2C3E50", align="right", border=_THIN),
+    "data_light": dict(fill="F8F9FA", size=10, color="2C3E50", align="right", border=_THIN),
+    "data_white_eur": dict(fill="FFFFFF", size=10, color="2C3E50", align="right", border=_THIN, num_format=_EURO),
+    "data_light_eur": dict(fill="F8F9FA", size=10, color="2C3E50", align="right", border=_THIN, num_format=_EURO),
+    "data_white_eur_pos": dict(fill="FFFFFF", bold=True, size=10, color="70AD47", align="right", border=_THIN, num_format=_EURO),
+    "data_light_eur_pos": dict(fill="F8F9FA", bold=True, size=10, color="70AD47", align="right", border=_THIN, num_format=_EURO),
+    # Übersicht (add_summary)
+    "sum_title_right": dict(fill="1F4E78", bold=True, size=14, color="FFFFFF", align="right", border=_MEDIUM),
+    "sum_title_center": dict(fill="1F4E78", bold=True, size=14, color="FFFFFF", align="center", border=_MEDIUM),
+    "sum_title_left": dict(fill="1F4E78", bold=True, size=14, color="FFFFFF", align="left", border=_MEDIUM),
+    "sum_header": dict(fill="4472C4", bold=True, size=11, color="FFFFFF", align="center", border=_MEDIUM),
+    "sum_name_white": dict(fill="FFFFFF", bold=True, size=11, color="2C3E50", align="left", border=_THIN),
+    "sum_name_light": dict(fill="F8F9FA", bold=True, size=11, color="2C3E50", align="left", border=_THIN),
+    "sum_pn_white": dict(fill="FFFFFF", size=10, color="5A6C7D", align="center", border=_THIN),
+    "sum_pn_light": dict(fill="F8F9FA", size=10, color="5A6C7D", align="center", border=_THIN),
+    "sum_pn_white_num": dict(fill="FFFFFF", size=10, color="5A6C7D", align="center", border=_THIN, num_format="00000000"),
+    "sum_pn_light_num": dict(fill="F8F9FA", size=10, color="5A6C7D", align="center", border=_THIN, num_format="00000000"),
+    "sum_total_white": dict(fill="FFFFFF", bold=True, size=11, color="70AD47", align="right", border=_THIN, num_format=_EURO),
+    "sum_total_light": dict(fill="F8F9FA", bold=True, size=11, color="70AD47", align="right", border=_THIN, num_format=_EURO),
+    "sum_grand_label": dict(fill="70AD47", bold=True, size=12, color="FFFFFF", align="right", border=_MEDIUM),
+    "sum_grand_empty": dict(fill="70AD47", border=_MEDIUM),
+    "sum_grand_total": dict(fill="70AD47", bold=True, size=12, color="FFFFFF", align="right", border=_MEDIUM, num_format=_EURO),
+}
+
+# Namen der openpyxl-NamedStyles, damit sie nicht mit Excel-Stilen wie "Total" kollidieren
+STYLE_PREFIX = "zulage_"
+
+COLUMN_MIN_WIDTHS = {1: 35, 2: 18, 3: 15, 4: 15, 5: 18}
+
+def _named_style(name: str, spec: dict) -> NamedStyle:
+    style = NamedStyle(name=STYLE_PREFIX + name)
+    style.fill = PatternFill(start_color=spec["fill"], end_color=spec["fill"], fill_type="solid")
+    side = Side(style=spec["border"][0], color=spec["border"][1])
+    style.border = Border(left=side, right=side, top=side, bottom=side)
+    if "size" in spec:
+        style.font = Font(bold=spec.get("bold", False), size=spec["size"], color=spec["color"])
+    else:
+        style.font = copy(DEFAULT_FONT)
+    if "align" in spec:
+        style.alignment = Alignment(horizontal=spec["align"], vertical="center")
+    if "num_format" in spec:
+        style.number_format = spec["num_format"]
+    return style
+
+def register_named_styles(workbook) -> None:
+    existing = set(workbook.named_styles)
+    for name, spec in STYLE_SPECS.items():
+        if STYLE_PREFIX + name not in existing:
+            workbook.add_named_style(_named_style(name, spec))
+
+def _cell_value(value):
+    # so, wie DataFrame.to_excel die Werte schreibt: fehlend -> "" (na_rep), numpy -> Python
+    if value is None or value is pd.NaT:
+        return ""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return ""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+def style_block_rows(kinds: list, rows: list) -> list:
+    # Zeilentypen aus dem Layout -> [(wert, stil)] je Zelle A-E,
+    # Detailzeilen abwechselnd hell/weiß ab jedem Unterkopf
+    styled = []
+    alternate = False
+    for kind, values in zip(kinds, rows):
+        if kind == "detail":
+            style = "data_white" if alternate else "data_light"
+            alternate = not alternate
         else:
-            fill_color = data_fill_white if alternate_row else data_fill_light
-            for cell in row:
-                cell.fill = fill_color
-                cell.font = Font(size=10, color="2C3E50")
-                cell.alignment = Alignment(horizontal="right", vertical="center")
-                cell.border = thin_border
-                if cell.column == 5:
-                    try:
-                        cell.value = float(cell.value)
-                        cell.number_format = '#,##0.00 €'
-                        if cell.value > 0:
-                            cell.font = Font(size=10, color="70AD47", bold=True)
-                    except (ValueError, TypeError):
-                        pass
-
-            alternate_row = not alternate_row
-            if not first_cell_value:
-                is_first_in_block = True
-                alternate_row = False
-
-    column_min_widths = {1: 35, 2: 18, 3: 15, 4: 15, 5: 18}
-    for col_idx, col in enumerate(sheet.columns, start=1):
-        max_length = max(len(str(cell.value) or "") for cell in col)
-        col_letter = get_column_letter(col[0].column)
-        calculated_width = max_length + 6
-        min_width = column_min_widths.get(col_idx, 12)
-        adjusted_width = max(calculated_width, min_width)
-        adjusted_width = min(adjusted_width, 65)
-        sheet.column_dimensions[col_letter].width = adjusted_width
-
-    for row in range(1, sheet.max_row + 1):
-        sheet.row_dimensions[row].height = 20
+            style = {"name": "name", "sub": "sub", "total": "total"}.get(kind, "data_light")
+            alternate = False
+
+        cells = [(v, style) for v in values[:4]]
+        value = values[4]
+        if style == "total":
+            cells.append((value, "total_eur"))
+        elif style.startswith("data_"):
+            try:
+                value = float(value)
+                cells.append((value, f"{style}_eur_pos" if value > 0 else f"{style}_eur"))
+            except (ValueError, TypeError):
+                cells.append((value, style))
+        else:
+            cells.append((value, style))
+        styled.append(cells)
+    return styled
+
+def _personalnummer_cell(personalnummer: str, shade: str) -> tuple:
+    # Ziffern als Zahl mit 8 Stellen, sonst ("Unbekannt", "P-100" aus der Mitarbeiterliste) als Text
+    if personalnummer.isdecimal():
+        return int(personalnummer), f"sum_pn_{shade}_num"
+    return personalnummer, f"sum_pn_{shade}"
+
+def summary_cells(summary_data: list, month_name: str = "") -> dict:
+    # Zeile -> [(spalte relativ zu start_col, wert, stil)]
+    summary_data = sorted(summary_data, key=lambda x: x[2], reverse=True)
+    rows = {
+        2: [(0, "Auszahlung Monat:", "sum_title_right"), (1, month_name or "Unbekannt", "sum_title_center"),
+            (2, "", "sum_title_left")],
+        3: [(i, h, "sum_header") for i, h in enumerate(["Name", "Personalnummer", "Gesamtverdienst (€)"])],
+    }
+    for r, (name, personalnummer, total) in enumerate(summary_data, start=4):
+        shade = "white" if r % 2 == 0 else "light"
+        pn_cell = (1, *_personalnummer_cell(personalnummer, shade))
+        rows[r] = [(0, name, f"sum_name_{shade}"), pn_cell, (2, float(total), f"sum_total_{shade}")]
 
-    sheet.row_dimensions[1].hidden = True
-    sheet.freeze_panes = "A3"
+    total_row = len(summary_data) + 4
+    rows[total_row] = [(0, "GESAMTSUMME", "sum_grand_label"), (1, "", "sum_grand_empty"),
+                       (2, sum(x[2] for x in summary_data), "sum_grand_total")]
+    return rows
+
+def add_summary(sheet, summary_data, start_col=9, month_name=""):
+    register_named_styles(sheet.parent)
+    rows = summary_cells(summary_data, month_name)
+    for r, cells in rows.items():
+        for offset, value, style in cells:
+            sheet.cell(row=r, column=start_col + offset, value=value).style = STYLE_PREFIX + style
+
+    for row in range(2, max(rows) + 1):
+        sheet.row_dimensions[row].height = 22
+
+    sheet.column_dimensions[get_column_letter(start_col)].width = 28
+    sheet.column_dimensions[get_column_letter(start_col + 1)].width = 20
+    sheet.column_dimensions[get_column_letter(start_col + 2)].width = 22
+
+WOCHENTAGE_MAPPING = {
+    "Monday": "Montag", "Tuesday": "Dienstag", "Wednesday": "Mittwoch",
+    "Thursday": "Donnerstag", "Friday": "Freitag", "Saturday": "Samstag",
+    "Sunday": "Sonntag"
+}
+# dayofweek 0 = Montag
+GERMAN_WEEKDAYS = np.array(["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"], dtype=object)
 
+# Einzelwert-Fassung, Referenz für format_date_labels (tests/test_date_labels.py)
 def format_date_with_german_weekday(date: pd.Timestamp) -> str:
-    wochentage_mapping = {
-        "Monday": "Montag", "Tuesday": "Dienstag", "Wednesday": "Mittwoch",
-        "Thursday": "Donnerstag", "Friday": "Freitag", "Saturday": "Samstag",
-        "Sunday": "Sonntag"
-    }
     english_weekday = date.strftime("%A")
-    german_weekday = wochentage_mapping.get(english_weekday, english_weekday)
+    german_weekday = WOCHENTAGE_MAPPING.get(english_weekday, english_weekday)
     original_kw = int(date.strftime("%W"))
     adjusted_kw = original_kw + 1 if original_kw < 53 else 1
     return date.strftime(f"%d.%m.%Y ({german_weekday}, KW{adjusted_kw})")
 
-def add_summary(sheet, summary_data, start_col=9, month_name=""):
-    header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-    subheader_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    cell_fill_white = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-    cell_fill_light = PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")
-    total_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-
-    thin_border = Border(
-        left=Side(style='thin', color='CCCCCC'),
-        right=Side(style='thin', color='CCCCCC'),
-        top=Side(style='thin', color='CCCCCC'),
-        bottom=Side(style='thin', color='CCCCCC')
-    )
-    medium_border = Border(
-        left=Side(style='medium', color='1F4E78'),
-        right=Side(style='medium', color='1F4E78'),
-        top=Side(style='medium', color='1F4E78'),
-        bottom=Side(style='medium', color='1F4E78')
-    )
+def format_date_labels(dates: pd.Series) -> pd.Series:
+    # wie format_date_with_german_weekday, aber jedes Datum nur einmal; NaT -> ""
+    codes, uniques = pd.factorize(pd.to_datetime(dates))
+    uniques = pd.DatetimeIndex(uniques)
+
+    weekday = uniques.dayofweek.to_numpy()
+    # %W: Woche mit Montag als erstem Tag, Tage vor dem ersten Montag = Woche 0
+    original_kw = (uniques.dayofyear.to_numpy() - 1 + 7 - weekday) // 7
+    adjusted_kw = np.where(original_kw < 53, original_kw + 1, 1)
+
+    labels = [
+        f"{day:02d}.{month:02d}.{year:04d} ({name}, KW{kw})"
+        for day, month, year, name, kw in zip(
+            uniques.day, uniques.month, uniques.year, GERMAN_WEEKDAYS[weekday], adjusted_kw
+        )
+    ]
+    labels = np.array(labels + [""], dtype=object)
+    return pd.Series(labels[codes], index=dates.index)
 
-    c1 = sheet.cell(row=2, column=start_col, value="Auszahlung Monat:")
-    c1.font = Font(bold=True, size=14, color="FFFFFF")
-    c1.alignment = Alignment(horizontal="right", vertical="center")
-    c1.fill = header_fill
-    c1.border = medium_border
-
-    c2 = sheet.cell(row=2, column=start_col + 1, value=month_name or "Unbekannt")
-    c2.font = Font(bold=True, size=14, color="FFFFFF")
-    c2.alignment = Alignment(horizontal="center", vertical="center")
-    c2.fill = header_fill
-    c2.border = medium_border
-
-    c3 = sheet.cell(row=2, column=start_col + 2, value="")
-    c3.font = Font(bold=True, size=14, color="FFFFFF")
-    c3.alignment = Alignment(horizontal="left", vertical="center")
-    c3.fill = header_fill
-    c3.border = medium_border
-
-    headers = ["Name", "Personalnummer", "Gesamtverdienst (€)"]
-    for i, h in enumerate(headers, start=start_col):
-        cell = sheet.cell(row=3, column=i, value=h)
-        cell.font = Font(bold=True, size=11, color="FFFFFF")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = subheader_fill
-        cell.border = medium_border
-
-    summary_data.sort(key=lambda x: x[2], reverse=True)
+# -------------------------------
+# Export
+# -------------------------------
+# "openpyxl": normales Workbook mit NamedStyles
+# "xlsxwriter": zeilenweise im constant_memory-Modus, gleiche Optik
+EXPORT_ENGINE = "openpyxl"
+
+class MonthSheet(NamedTuple):
+    name: str          # "<Monat> <Jahr>", auch Titel der Übersicht
+    rows: np.ndarray   # Zeilen A-E ab Zeile 2, Form (n, 5)
+    kinds: np.ndarray  # Zeilentyp je Zeile: name, sub, detail, total, spacer
+    summary: list      # [Name, Personalnummer, Gesamtverdienst] je Fahrer
+
+class SheetPlan(NamedTuple):
+    cells: list    # je Zeile ab Zeile 1: [(wert, stil)] für A-E
+    summary: dict  # Zeile -> [(spalte relativ zu start_col, wert, stil)]
+    widths: dict   # Spalte (1-basiert) -> Breite
+    max_row: int
+
+def month_periods(all_data: pd.DataFrame) -> list:
+    # vorhandene Monate als JJJJMM, aufsteigend
+    if all_data.empty:
+        return []
+    periods = (all_data["Jahr"].astype(float) * 100 + all_data["Monat"]).dropna().unique()
+    return sorted(int(p) for p in periods)
+
+def select_months(all_data: pd.DataFrame, von: Optional[tuple] = None, bis: Optional[tuple] = None) -> pd.DataFrame:
+    # nur Touren von (Jahr, Monat) bis (Jahr, Monat) einschließlich
+    if all_data.empty or (von is None and bis is None):
+        return all_data
+    # Jahr ist ggf. int16, JJJJMM passt da nicht hinein
+    period = (all_data["Jahr"].astype(float) * 100 + all_data["Monat"]).to_numpy()
+    mask = np.ones(len(all_data), dtype=bool)
+    if von is not None:
+        mask &= period >= von[0] * 100 + von[1]
+    if bis is not None:
+        mask &= period <= bis[0] * 100 + bis[1]
+    return all_data[mask]
+
+# Touren und Zulage je Monat, Fahrer und Fahrzeugart, einmal berechnet für Übersichten,
+# Jahresübersicht und Diagramme
+CUBE_KEYS = ["Jahr", "Monat", "Nachname", "Vorname", "Art"]
+CUBE_SPALTEN = CUBE_KEYS + ["Touren", "Verdienst"]
+
+def _first_personalnummer(data: pd.DataFrame) -> pd.Series:
+    # erste brauchbare Personalnummer je Monat und Fahrer in Touren-Reihenfolge (wie build_month_layout)
+    codes, uniques = pd.factorize(data["Personalnummer"])
+    keys = np.array([_lookup_key(u) for u in uniques] + [None], dtype=object)[codes]
+    keys = pd.Series(keys, index=data.index, dtype=object)
+    return keys.groupby([data[k] for k in CUBE_KEYS[:4]], sort=False, observed=True).transform("first")
+
+def aggregation_cube(data: pd.DataFrame) -> pd.DataFrame:
+    # nimmt einzelne Touren oder schon verdichtete Teile (Spalte "Touren"), z. B. mehrere Blöcke
+    if data.empty:
+        return pd.DataFrame(columns=CUBE_SPALTEN)
+    agg = {"Touren": ("Touren", "sum") if "Touren" in data.columns else ("Verdienst", "size"),
+           "Verdienst": ("Verdienst", "sum")}
+    if "Personalnummer" in data.columns:
+        data = data.assign(Personalnummer=_first_personalnummer(data))
+        agg["Personalnummer"] = ("Personalnummer", "first")
+    cube = data.groupby(CUBE_KEYS, sort=True, observed=True).agg(**agg).reset_index()
+    return compact_tours(cube)
+
+def as_cube(data: pd.DataFrame) -> pd.DataFrame:
+    return data if is_month_totals(data) else aggregation_cube(data)
+
+def cube_months(cube: pd.DataFrame) -> dict:
+    # (Jahr, Monat) -> Positionen im Würfel, aufsteigend
+    if cube.empty:
+        return {}
+    return dict(sorted(cube.groupby(["Jahr", "Monat"], sort=True).indices.items()))
+
+def month_summary(month_data: pd.DataFrame, register: Optional[PersonalRegister] = None) -> list:
+    # [Name, Personalnummer, Gesamtverdienst] je Fahrer wie in build_month_layout, ohne Detailzeilen
+    register = register or current_personal_register()
+    groups = month_data.groupby(driver_keys(month_data), sort=True)
+    totals = groups["Verdienst"].sum().to_numpy()
+    nachnamen = groups["Nachname"].first().to_numpy(dtype=object)
+    vornamen = groups["Vorname"].first().to_numpy(dtype=object)
+    nummern = groups["Personalnummer"].first().to_numpy(dtype=object) if "Personalnummer" in month_data.columns else None
+    summary_data = []
+    for i, total in enumerate(totals):
+        vn = (vornamen[i] or "").strip()
+        nn = (nachnamen[i] or "").strip()
+        pn = None if nummern is None else nummern[i]
+        summary_data.append([f"{vn} {nn}".strip(), register.lookup(nn, vn, _lookup_key(pn)), float(total)])
+    return summary_data
+
+def _lookup_key(personalnummer):
+    # hashbar und ohne NaN für den Lookup-Cache
+    pn = _norm_personalnummer(personalnummer)
+    return pn or None
+
+UNBEKANNT_SHEET = "Unbekannte Fahrer"
+UNBEKANNT_SPALTEN = ["Nachname", "Vorname", "Touren", "Monate"]
+
+def unresolved_drivers(all_data: pd.DataFrame, register: Optional[PersonalRegister] = None) -> pd.DataFrame:
+    # alle Fahrer, deren Personalnummer in mindestens einem Monat "Unbekannt" bleibt, auf einen Blick
+    register = register or current_personal_register()
+    if all_data.empty:
+        return pd.DataFrame(columns=UNBEKANNT_SPALTEN)
+    groups = all_data.groupby([driver_keys(all_data), all_data["Jahr"], all_data["Monat"]], sort=True)
+    # Teilsummen zählen ihre Touren selbst
+    counts = groups["Touren"].sum() if is_month_totals(all_data) else groups.size()
+    nachnamen = groups["Nachname"].first().to_numpy(dtype=object)
+    vornamen = groups["Vorname"].first().to_numpy(dtype=object)
+    nummern = groups["Personalnummer"].first().to_numpy(dtype=object) if "Personalnummer" in all_data.columns else None
+
+    found = {}
+    for i, ((_, jahr, monat), count) in enumerate(counts.items()):
+        nn, vn = (nachnamen[i] or "").strip(), (vornamen[i] or "").strip()
+        pn = None if nummern is None else nummern[i]
+        if register.lookup(nn, vn, _lookup_key(pn)) != "Unbekannt":
+            continue
+        entry = found.setdefault((nn, vn), [0, []])
+        entry[0] += int(count)
+        entry[1].append(f"{get_german_month_name(monat)} {jahr}")
+    return pd.DataFrame([[nn, vn, touren, ", ".join(monate)] for (nn, vn), (touren, monate) in found.items()],
+                        columns=UNBEKANNT_SPALTEN)
+
+def unresolved_cells(unresolved: pd.DataFrame) -> list:
+    # Zeilen ab Zeile 1: [(wert, stil)] im Stil der Übersicht
+    rows = [[(h, "sum_header") for h in UNBEKANNT_SPALTEN]]
+    for r, values in enumerate(unresolved.itertuples(index=False), start=2):
+        shade = "white" if r % 2 == 0 else "light"
+        rows.append([(_cell_value(v), f"sum_name_{shade}") for v in values])
+    return rows
+
+UNBEKANNT_BREITEN = [25, 25, 10, 60]
+
+JAHR_SHEET = "Jahresübersicht {jahr}"
+
+def year_overview_cells(cube: pd.DataFrame, register: Optional[PersonalRegister] = None) -> list:
+    # Würfel eines Jahres -> Zeilen ab Zeile 1: Zulage je Fahrer und Monat, darunter je Fahrzeugart
+    register = register or current_personal_register()
+    monate = sorted(int(m) for m in cube["Monat"].unique())
+    spalten = [get_german_month_name(m) for m in monate] + ["Gesamt (€)"]
+
+    fahrer = driver_keys(cube)
+    groups = cube.groupby(fahrer, sort=True)
+    nachnamen = groups["Nachname"].first().to_numpy(dtype=object)
+    vornamen = groups["Vorname"].first().to_numpy(dtype=object)
+    nummern = groups["Personalnummer"].first().to_numpy(dtype=object) if "Personalnummer" in cube.columns else None
+    zulage = (cube.groupby([fahrer, cube["Monat"].to_numpy()], sort=True)["Verdienst"].sum()
+                  .unstack(fill_value=0).reindex(columns=monate, fill_value=0))
+
+    rows = [[(h, "sum_header") for h in ["Name", "Personalnummer"] + spalten]]
+    for i, values in enumerate(zulage.to_numpy(dtype=float)):
+        shade = "white" if (i + 2) % 2 == 0 else "light"
+        nn, vn = (nachnamen[i] or "").strip(), (vornamen[i] or "").strip()
+        personalnummer = register.lookup(nn, vn, None if nummern is None else _lookup_key(nummern[i]))
+        pn_cell = _personalnummer_cell(personalnummer, shade)
+        rows.append([(f"{vn} {nn}".strip(), f"sum_name_{shade}"), pn_cell]
+                    + [(float(v), f"sum_total_{shade}") for v in values] + [(float(values.sum()), f"sum_total_{shade}")])
+    summe = zulage.to_numpy(dtype=float).sum(axis=0)
+    rows.append([("GESAMTSUMME", "sum_grand_label"), ("", "sum_grand_empty")]
+                + [(float(v), "sum_grand_total") for v in summe] + [(float(summe.sum()), "sum_grand_total")])
+
+    # je Fahrzeugart: Touren im Jahr und Zulage je Monat
+    rows.append([])
+    rows.append([(h, "sum_header") for h in ["Fahrzeugart", "Touren"] + spalten])
+    arten = cube.groupby(["Art", "Monat"], sort=True, observed=True)["Verdienst"].sum().unstack(fill_value=0)
+    arten = arten.reindex(columns=monate, fill_value=0)
+    touren = cube.groupby("Art", sort=True, observed=True)["Touren"].sum()
+    for i, (art, values) in enumerate(zip(arten.index, arten.to_numpy(dtype=float))):
+        shade = "white" if i % 2 == 0 else "light"
+        rows.append([(art, f"sum_name_{shade}"), (int(touren[art]), f"sum_pn_{shade}")]
+                    + [(float(v), f"sum_total_{shade}") for v in values] + [(float(values.sum()), f"sum_total_{shade}")])
+    return rows
+
+def year_overview_widths(rows: list) -> list:
+    return [28, 20] + [14] * (len(rows[0]) - 3) + [16]
+
+def iter_year_overviews(cube: pd.DataFrame, diagnostics: Optional[Diagnostics] = None,
+                        register: Optional[PersonalRegister] = None):
+    # (Blattname, Zeilen) je Jahr im Würfel
+    diagnostics = diagnostics or Diagnostics()
+    if cube.empty:
+        return
+    for jahr, positions in sorted(cube.groupby("Jahr", sort=True).indices.items()):
+        sheet_name = JAHR_SHEET.format(jahr=jahr)
+        with diagnostics.stage("layout", sheet=sheet_name, rows=len(positions)):
+            rows = year_overview_cells(cube.iloc[positions], register)
+        yield sheet_name, rows
+
+def iter_month_summaries(all_data: pd.DataFrame, diagnostics: Optional[Diagnostics] = None,
+                         register: Optional[PersonalRegister] = None, cube: Optional[pd.DataFrame] = None):
+    # nur die Übersicht je Monat, direkt aus dem Würfel: kein Sortieren der Touren, keine Datumstexte
+    diagnostics = diagnostics or Diagnostics()
+    cube = as_cube(all_data) if cube is None else cube
+    for (year, month), positions in cube_months(cube).items():
+        sheet_name = f"{get_german_month_name(month)} {year}"
+        with diagnostics.stage("layout", sheet=sheet_name, rows=len(positions)):
+            summary_data = month_summary(cube.iloc[positions], register)
+        yield MonthSheet(sheet_name, np.empty((0, 5), dtype=object), np.empty(0, dtype=object), summary_data)
+
+def iter_month_sheets(all_data: pd.DataFrame, diagnostics: Optional[Diagnostics] = None,
+                      register: Optional[PersonalRegister] = None, cube: Optional[pd.DataFrame] = None):
+    diagnostics = diagnostics or Diagnostics()
+    cube = aggregation_cube(all_data) if cube is None else cube
+    summaries = cube_months(cube)
+    with diagnostics.stage("sort", rows=len(all_data)):
+        # stabil nach Jahr, Monat, Fahrer-Schlüssel (= Nachname, Vorname), ohne Strings zu vergleichen
+        order = np.lexsort((driver_keys(all_data), all_data["Monat"].to_numpy(), all_data["Jahr"].to_numpy()))
+        sorted_data = all_data.take(order)
+        labels = format_date_labels(sorted_data["Datum"]).to_numpy()
+
+        # nach der Sortierung ist jeder Monat ein zusammenhängender Bereich
+        months = sorted_data.groupby(["Jahr", "Monat"], sort=False).indices
+    for year, month in sorted(months):
+        positions = months[(year, month)]
+        sheet_name = f"{get_german_month_name(month)} {year}"
+        with diagnostics.stage("layout", sheet=sheet_name, rows=len(positions)):
+            month_data = sorted_data.iloc[positions]
+            summary_data = month_summary(cube.iloc[summaries[(year, month)]], register)
+            month_sheet = build_month_layout(sheet_name, month_data, labels[positions], register, summary_data)
+        yield month_sheet
+
+SUBHEADER_ROW = ["Datum", "Tour", "LKW", "Art", "Verdienst"]
+
+def build_month_layout(sheet_name: str, month_data: pd.DataFrame, date_labels: np.ndarray,
+                       register: Optional[PersonalRegister] = None,
+                       summary_data: Optional[list] = None) -> MonthSheet:
+    # month_data ist nach Nachname, Vorname sortiert. Je Fahrer ein Block:
+    # Name, Unterkopf, Detailzeilen, "Gesamtverdienst", Leerzeile.
+    # summary_data: Übersicht aus dem Würfel (month_summary), sonst hier aus den Touren
+    register = register or current_personal_register()
+    n = len(month_data)
+    nachname = month_data["Nachname"].to_numpy(dtype=object)
+    vorname = month_data["Vorname"].to_numpy(dtype=object)
+    verdienst = month_data["Verdienst"].to_numpy(dtype=float)
+
+    fahrer = driver_keys(month_data)
+    new_driver = np.ones(n, dtype=bool)
+    new_driver[1:] = fahrer[1:] != fahrer[:-1]
+    starts = np.flatnonzero(new_driver)
+    counts = np.diff(np.append(starts, n))
+    totals = np.add.reduceat(verdienst, starts) if n else np.zeros(0)
+
+    block_start = np.concatenate(([0], np.cumsum(counts + 4)[:-1])).astype(np.int64)
+    driver_of_row = np.repeat(np.arange(len(starts)), counts)
+    detail_pos = block_start[driver_of_row] + 2 + (np.arange(n) - starts[driver_of_row])
+    total_pos = block_start + 2 + counts
+
+    size = n + 4 * len(starts)
+    rows = np.full((size, 5), "", dtype=object)
+    kinds = np.full(size, "spacer", dtype=object)
+
+    names = []
+    for start in starts:
+        vn = (vorname[start] or "").strip()
+        nn = (nachname[start] or "").strip()
+        names.append(f"{vn} {nn}".strip())
+
+    if summary_data is None:
+        # erste vorhandene Personalnummer je Fahrer, falls der Export eine hat
+        nummern = [None] * len(starts)
+        if "Personalnummer" in month_data.columns:
+            column = month_data["Personalnummer"].to_numpy(dtype=object)
+            for i, (start, count) in enumerate(zip(starts, counts)):
+                nummern[i] = next((v for v in column[start:start + count] if _lookup_key(v)), None)
+        summary_data = [
+            [name, register.lookup((nachname[start] or "").strip(), (vorname[start] or "").strip(),
+                                   _lookup_key(nummern[i])), float(totals[i])]
+            for i, (name, start) in enumerate(zip(names, starts))
+        ]
+
+    rows[block_start, 0] = names
+    kinds[block_start] = "name"
+    rows[block_start + 1] = SUBHEADER_ROW
+    kinds[block_start + 1] = "sub"
+
+    rows[detail_pos, 0] = date_labels
+    rows[detail_pos, 1] = month_data["Tour"].to_numpy(dtype=object)
+    rows[detail_pos, 2] = month_data["LKW"].to_numpy(dtype=object)
+    rows[detail_pos, 3] = month_data["Art"].to_numpy(dtype=object)
+    rows[detail_pos, 4] = verdienst
+    kinds[detail_pos] = "detail"
+
+    rows[total_pos, 0] = "Gesamtverdienst"
+    rows[total_pos, 4] = totals
+    kinds[total_pos] = "total"
+
+    return MonthSheet(sheet_name, rows, kinds, summary_data)
+
+def plan_sheet(month_sheet: MonthSheet, start_col: int = 9) -> SheetPlan:
+    # Zeile 1 = (ausgeblendete) Spaltenköpfe 0-4, danach die Blöcke; A-E werden bis
+    # zur letzten Zeile der Übersicht formatiert
+    rows = [[0, 1, 2, 3, 4]] + [[_cell_value(v) for v in r] for r in month_sheet.rows]
+    kinds = ["header"] + list(month_sheet.kinds)
+    summary = summary_cells(month_sheet.summary, month_sheet.name)
+
+    max_row = max(len(rows), max(summary))
+    rows += [[None] * 5 for _ in range(max_row - len(rows))]
+    kinds += ["spacer"] * (max_row - len(kinds))
+    cells = style_block_rows(kinds, rows)
+
+    # Spaltenbreiten aus den geschriebenen Werten (leere Zellen zählen als "None")
+    max_col = start_col + 2
+    lengths = {c: 0 for c in range(1, max_col + 1)}
+    for r in range(1, max_row + 1):
+        row_values = {c: v for c, (v, _) in enumerate(cells[r - 1], start=1)}
+        for offset, value, _ in summary.get(r, []):
+            row_values[start_col + offset] = value
+        for c in lengths:
+            lengths[c] = max(lengths[c], len(str(row_values.get(c))))
+    widths = {c: min(max(length + 6, COLUMN_MIN_WIDTHS.get(c, 12)), 65) for c, length in lengths.items()}
+
+    return SheetPlan(cells, summary, widths, max_row)
+
+def export_report(all_data: pd.DataFrame, engine: str = EXPORT_ENGINE,
+                  diagnostics: Optional[Diagnostics] = None, von: Optional[tuple] = None,
+                  bis: Optional[tuple] = None, overview_only: bool = False,
+                  register: Optional[PersonalRegister] = None, cube: Optional[pd.DataFrame] = None,
+                  progress=None) -> bytes:
+    # komplett im Speicher, damit sich parallele Sessions keine Datei teilen.
+    # von/bis: nur diese Monate aufbereiten, overview_only: nur die Auszahlungs-Übersicht je Monat.
+    # Übersichten, Jahresübersicht und "Unbekannte Fahrer" kommen aus einem Würfel (aggregation_cube),
+    # cube: schon berechneter Würfel derselben Touren (z. B. aus der App).
+    # progress(fertig, gesamt, blatt) nach jedem geschriebenen Blatt, darf mit JobCancelled abbrechen
+    diagnostics = diagnostics or Diagnostics()
+    register = register or current_personal_register()
+    if is_month_totals(all_data) and not overview_only:
+        raise ValueError("Aus Teilsummen je Monat lässt sich nur die Übersicht erstellen (overview_only).")
+    buffer = io.BytesIO()
+    with diagnostics.stage("export", engine=engine, rows=len(all_data), overview_only=overview_only):
+        with diagnostics.stage("select") as record:
+            all_data = select_months(all_data, von, bis)
+            record["rows"] = len(all_data)
+        with diagnostics.stage("cube") as record:
+            cube = as_cube(all_data) if cube is None else select_months(cube, von, bis)
+            record["rows"] = len(cube)
+        with diagnostics.stage("unresolved") as record:
+            unresolved = unresolved_drivers(cube, register)
+            record["rows"] = len(unresolved)
+        sheet_done = _sheet_counter(progress, cube, unresolved)
+        if engine == "xlsxwriter":
+            _export_xlsxwriter(all_data, buffer, diagnostics, overview_only, register, unresolved, cube, sheet_done)
+        else:
+            _export_openpyxl(all_data, buffer, diagnostics, overview_only, register, unresolved, cube, sheet_done)
+    lookup = register.lookup.cache_info()
+    diagnostics.meta["personal_lookup_cache"] = {"hits": lookup.hits, "misses": lookup.misses}
+    return buffer.getvalue()
+
+def _sheet_counter(progress, cube: pd.DataFrame, unresolved: pd.DataFrame):
+    # Monatsblätter + Jahresübersichten + "Unbekannte Fahrer", alles schon aus dem Würfel bekannt
+    progress = progress or _no_progress
+    total = len(cube_months(cube)) + (int(cube["Jahr"].nunique()) if not cube.empty else 0) + int(not unresolved.empty)
+    done = 0
+
+    def sheet_done(name: str) -> None:
+        nonlocal done
+        done += 1
+        progress(done, total, name)
+
+    return sheet_done
+
+def _planned_sheets(all_data: pd.DataFrame, diagnostics: Diagnostics, register: PersonalRegister,
+                    cube: Optional[pd.DataFrame] = None):
+    for month_sheet in iter_month_sheets(all_data, diagnostics, register, cube):
+        with diagnostics.stage("styling", sheet=month_sheet.name, rows=len(month_sheet.rows)):
+            plan = plan_sheet(month_sheet)
+        yield month_sheet, plan
+
+def _write_month_sheet_openpyxl(workbook, month_sheet: MonthSheet, start_col: int = 9,
+                                plan: Optional[SheetPlan] = None) -> None:
+    plan = plan or plan_sheet(month_sheet, start_col)
+    sheet = workbook.create_sheet(month_sheet.name[:31])
+
+    for r, row in enumerate(plan.cells, start=1):
+        for c, (value, style) in enumerate(row, start=1):
+            sheet.cell(row=r, column=c, value=value).style = STYLE_PREFIX + style
+
+    add_summary(sheet, month_sheet.summary, start_col=start_col, month_name=month_sheet.name)
+
+    for c, width in plan.widths.items():
+        sheet.column_dimensions[get_column_letter(c)].width = width
+    for row in range(1, plan.max_row + 1):
+        sheet.row_dimensions[row].height = 20
 
-    for r, (name, personalnummer, total) in enumerate(summary_data, start=4):
-        fill_color = cell_fill_white if r % 2 == 0 else cell_fill_light
-
-        nc = sheet.cell(row=r, column=start_col, value=name)
-        nc.font = Font(bold=True, size=11, color="2C3E50")
-        nc.alignment = Alignment(horizontal="left", vertical="center")
-        nc.fill = fill_color
-        nc.border = thin_border
-
-        pn_cell = sheet.cell(row=r, column=start_col + 1)
-        if personalnummer != "Unbekannt":
-            pn_cell.value = int(personalnummer)
-            pn_cell.number_format = '00000000'
+    sheet.row_dimensions[1].hidden = True
+    sheet.freeze_panes = "A3"
+
+def _write_year_sheet_openpyxl(workbook, sheet_name: str, rows: list) -> None:
+    sheet = workbook.create_sheet(sheet_name[:31])
+    for r, row in enumerate(rows, start=1):
+        for c, (value, style) in enumerate(row, start=1):
+            sheet.cell(row=r, column=c, value=value).style = STYLE_PREFIX + style
+    for c, width in enumerate(year_overview_widths(rows), start=1):
+        sheet.column_dimensions[get_column_letter(c)].width = width
+    sheet.freeze_panes = "C2"
+
+def _write_overview_sheet_openpyxl(workbook, month_sheet: MonthSheet) -> None:
+    sheet = workbook.create_sheet(month_sheet.name[:31])
+    add_summary(sheet, month_sheet.summary, start_col=1, month_name=month_sheet.name)
+
+def _write_unresolved_sheet_openpyxl(workbook, unresolved: pd.DataFrame) -> None:
+    sheet = workbook.create_sheet(UNBEKANNT_SHEET)
+    for r, row in enumerate(unresolved_cells(unresolved), start=1):
+        for c, (value, style) in enumerate(row, start=1):
+            sheet.cell(row=r, column=c, value=value).style = STYLE_PREFIX + style
+    for c, width in enumerate(UNBEKANNT_BREITEN, start=1):
+        sheet.column_dimensions[get_column_letter(c)].width = width
+    sheet.freeze_panes = "A2"
+
+def _export_openpyxl(all_data: pd.DataFrame, buffer, diagnostics: Diagnostics, overview_only: bool = False,
+                     register: Optional[PersonalRegister] = None, unresolved: Optional[pd.DataFrame] = None,
+                     cube: Optional[pd.DataFrame] = None, sheet_done=None) -> None:
+    cube = as_cube(all_data) if cube is None else cube
+    sheet_done = sheet_done or _no_progress
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    register_named_styles(workbook)
+    if overview_only:
+        for month_sheet in iter_month_summaries(all_data, diagnostics, register, cube):
+            with diagnostics.stage("write", sheet=month_sheet.name, rows=len(month_sheet.summary)):
+                _write_overview_sheet_openpyxl(workbook, month_sheet)
+            sheet_done(month_sheet.name)
+    else:
+        for month_sheet, plan in _planned_sheets(all_data, diagnostics, register, cube):
+            with diagnostics.stage("write", sheet=month_sheet.name, rows=plan.max_row):
+                _write_month_sheet_openpyxl(workbook, month_sheet, plan=plan)
+            sheet_done(month_sheet.name)
+    for sheet_name, rows in iter_year_overviews(cube, diagnostics, register):
+        with diagnostics.stage("write", sheet=sheet_name, rows=len(rows)):
+            _write_year_sheet_openpyxl(workbook, sheet_name, rows)
+        sheet_done(sheet_name)
+    if unresolved is not None and not unresolved.empty:
+        _write_unresolved_sheet_openpyxl(workbook, unresolved)
+        sheet_done(UNBEKANNT_SHEET)
+    if not workbook.worksheets:
+        # leere Auswahl: Excel braucht mindestens ein Blatt
+        workbook.create_sheet("Keine Daten")
+    with diagnostics.stage("save"):
+        workbook.save(buffer)
+
+def _xlsxwriter_formats(workbook) -> dict:
+    formats = {}
+    for name, spec in STYLE_SPECS.items():
+        props = {"pattern": 1, "bg_color": f"#{spec['fill']}"}
+        if "size" in spec:
+            props.update({"font_size": spec["size"], "font_color": f"#{spec['color']}", "bold": spec.get("bold", False)})
+        if "align" in spec:
+            props.update({"align": spec["align"], "valign": "vcenter"})
+        style, color = spec["border"]
+        props.update({"border": 1 if style == "thin" else 2, "border_color": f"#{color}"})
+        if "num_format" in spec:
+            props["num_format"] = spec["num_format"]
+        formats[name] = workbook.add_format(props)
+    return formats
+
+def _write_month_sheet_xlsxwriter(workbook, formats: dict, month_sheet: MonthSheet, start_col: int = 9,
+                                  plan: Optional[SheetPlan] = None) -> None:
+    plan = plan or plan_sheet(month_sheet, start_col)
+    ws = workbook.add_worksheet(month_sheet.name[:31])
+    for c, width in plan.widths.items():
+        # XlsxWriter rechnet Zeichen -> Excel-Breite mit Innenabstand um, so ergibt sich exakt width
+        ws.set_column(c - 1, c - 1, width - 5 / 7)
+    ws.freeze_panes(2, 0)
+
+    for r in range(1, plan.max_row + 1):
+        ws.set_row(r - 1, 20, None, {"hidden": r == 1})
+        for c, (value, style) in enumerate(plan.cells[r - 1]):
+            _write_xlsxwriter_cell(ws, r - 1, c, value, formats[style])
+        for offset, value, style in plan.summary.get(r, []):
+            _write_xlsxwriter_cell(ws, r - 1, start_col - 1 + offset, value, formats[style])
+
+def _write_xlsxwriter_cell(ws, row: int, col: int, value, fmt) -> None:
+    if value is None or value == "":
+        ws.write_blank(row, col, None, fmt)
+    elif isinstance(value, str):
+        ws.write_string(row, col, value, fmt)
+    else:
+        ws.write(row, col, value, fmt)
+
+def _write_year_sheet_xlsxwriter(workbook, formats: dict, sheet_name: str, rows: list) -> None:
+    ws = workbook.add_worksheet(sheet_name[:31])
+    for c, width in enumerate(year_overview_widths(rows)):
+        ws.set_column(c, c, width - 5 / 7)
+    ws.freeze_panes(1, 2)
+    for r, row in enumerate(rows):
+        for c, (value, style) in enumerate(row):
+            _write_xlsxwriter_cell(ws, r, c, value, formats[style])
+
+def _write_overview_sheet_xlsxwriter(workbook, formats: dict, month_sheet: MonthSheet) -> None:
+    ws = workbook.add_worksheet(month_sheet.name[:31])
+    # Breiten wie in add_summary
+    for c, width in enumerate([28, 20, 22]):
+        ws.set_column(c, c, width - 5 / 7)
+    rows = summary_cells(month_sheet.summary, month_sheet.name)
+    for r in range(2, max(rows) + 1):
+        ws.set_row(r - 1, 22)
+        for offset, value, style in rows.get(r, []):
+            _write_xlsxwriter_cell(ws, r - 1, offset, value, formats[style])
+
+def _write_unresolved_sheet_xlsxwriter(workbook, formats: dict, unresolved: pd.DataFrame) -> None:
+    ws = workbook.add_worksheet(UNBEKANNT_SHEET)
+    for c, width in enumerate(UNBEKANNT_BREITEN):
+        ws.set_column(c, c, width - 5 / 7)
+    ws.freeze_panes(1, 0)
+    for r, row in enumerate(unresolved_cells(unresolved)):
+        for c, (value, style) in enumerate(row):
+            _write_xlsxwriter_cell(ws, r, c, value, formats[style])
+
+def _export_xlsxwriter(all_data: pd.DataFrame, buffer, diagnostics: Diagnostics, overview_only: bool = False,
+                       register: Optional[PersonalRegister] = None, unresolved: Optional[pd.DataFrame] = None,
+                       cube: Optional[pd.DataFrame] = None, sheet_done=None) -> None:
+    import xlsxwriter
+
+    cube = as_cube(all_data) if cube is None else cube
+    sheet_done = sheet_done or _no_progress
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    try:
+        formats = _xlsxwriter_formats(workbook)
+        if overview_only:
+            for month_sheet in iter_month_summaries(all_data, diagnostics, register, cube):
+                with diagnostics.stage("write", sheet=month_sheet.name, rows=len(month_sheet.summary)):
+                    _write_overview_sheet_xlsxwriter(workbook, formats, month_sheet)
+                sheet_done(month_sheet.name)
         else:
-            pn_cell.value = personalnummer
-        pn_cell.font = Font(size=10, color="5A6C7D")
-        pn_cell.alignment = Alignment(horizontal="center", vertical="center")
-        pn_cell.fill = fill_color
-        pn_cell.border = thin_border
-
-        tc = sheet.cell(row=r, column=start_col + 2, value=float(total))
-        tc.font = Font(bold=True, size=11, color="70AD47")
-        tc.fill = fill_color
-        tc.border = thin_border
-        tc.number_format = '#,##0.00 €'
-        tc.alignment = Alignment(horizontal="right", vertical="center")
+            for month_sheet, plan in _planned_sheets(all_data, diagnostics, register, cube):
+                with diagnostics.stage("write", sheet=month_sheet.name, rows=plan.max_row):
+                    _write_month_sheet_xlsxwriter(workbook, formats, month_sheet, plan=plan)
+                sheet_done(month_sheet.name)
+        for sheet_name, rows in iter_year_overviews(cube, diagnostics, register):
+            with diagnostics.stage("write", sheet=sheet_name, rows=len(rows)):
+                _write_year_sheet_xlsxwriter(workbook, formats, sheet_name, rows)
+            sheet_done(sheet_name)
+        if unresolved is not None and not unresolved.empty:
+            _write_unresolved_sheet_xlsxwriter(workbook, formats, unresolved)
+            sheet_done(UNBEKANNT_SHEET)
+    finally:
+        with diagnostics.stage("save"):
+            workbook.close()
 
-    total_row = len(summary_data) + 4
+# -------------------------------
+# Lohn-Import: CSV/Parquet ohne Formatierung
+# -------------------------------
+# dieselben Zahlen wie die Übersicht je Monat, ohne openpyxl/Styling
+PAYROLL_FORMATS = ("csv", "parquet")
+PAYROLL_SPALTEN = ["Jahr", "Monat", "Name", "Personalnummer", "Gesamtverdienst"]
+PAYROLL_DETAIL_SPALTEN = ["Jahr", "Monat", "Nachname", "Vorname", "Personalnummer",
+                          "Datum", "Tour", "LKW", "Art", "Verdienst"]
+
+def payroll_summary(all_data: pd.DataFrame, diagnostics: Optional[Diagnostics] = None,
+                    register: Optional[PersonalRegister] = None, cube: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    # je Monat und Fahrer eine Zeile: Name, Personalnummer, Gesamtverdienst (wie add_summary);
+    # cube: schon berechneter Würfel derselben Touren
+    diagnostics = diagnostics or Diagnostics()
+    cube = as_cube(all_data) if cube is None else cube
+    rows = []
+    for (jahr, monat), positions in cube_months(cube).items():
+        with diagnostics.stage("layout", sheet=f"{get_german_month_name(monat)} {jahr}", rows=len(positions)):
+            entries = month_summary(cube.iloc[positions], register)
+        # Reihenfolge wie in der Übersicht (summary_cells): höchste Auszahlung zuerst
+        rows.extend([int(jahr), int(monat), *entry] for entry in sorted(entries, key=lambda x: x[2], reverse=True))
+    # Personalnummer als Text, damit die führenden Nullen bleiben
+    summary = pd.DataFrame(rows, columns=PAYROLL_SPALTEN)
+    return summary.astype({"Jahr": "int16", "Monat": "int8", "Personalnummer": object, "Gesamtverdienst": float})
+
+def payroll_details(all_data: pd.DataFrame, register: Optional[PersonalRegister] = None) -> pd.DataFrame:
+    # alle Touren in der Reihenfolge der Monatsblätter, mit der Personalnummer der Übersicht
+    if is_month_totals(all_data):
+        raise ValueError("Teilsummen je Monat enthalten keine einzelnen Touren.")
+    register = register or current_personal_register()
+    if all_data.empty:
+        return pd.DataFrame(columns=PAYROLL_DETAIL_SPALTEN)
+    fahrer = driver_keys(all_data)
+    order = np.lexsort((fahrer, all_data["Monat"].to_numpy(), all_data["Jahr"].to_numpy()))
+    data = all_data.take(order)
+    fahrer = fahrer[order]
+
+    groups = data.groupby(fahrer, sort=True)
+    nachnamen = groups["Nachname"].first()
+    vornamen = groups["Vorname"].first()
+    nummern = groups["Personalnummer"].first() if "Personalnummer" in data.columns else None
+    personalnummer = {
+        key: register.lookup((nachnamen[key] or "").strip(), (vornamen[key] or "").strip(),
+                             None if nummern is None else _lookup_key(nummern[key]))
+        for key in nachnamen.index
+    }
+    return pd.DataFrame({
+        "Jahr": data["Jahr"].to_numpy(),
+        "Monat": data["Monat"].to_numpy(),
+        "Nachname": data["Nachname"].to_numpy(dtype=object),
+        "Vorname": data["Vorname"].to_numpy(dtype=object),
+        "Personalnummer": pd.Series(fahrer).map(personalnummer).to_numpy(dtype=object),
+        "Datum": data["Datum"].to_numpy(),
+        # Tour als Text wie in der Mappe angezeigt (1234.0 -> "1234"), Parquet braucht einen Typ je Spalte
+        "Tour": _canonical_column(data["Tour"]),
+        "LKW": data["LKW"].astype(object).where(data["LKW"].notna(), "").to_numpy(dtype=object),
+        "Art": data["Art"].astype(object).to_numpy(dtype=object),
+        "Verdienst": data["Verdienst"].to_numpy(dtype=float),
+    })
+
+def payroll_bytes(frame: pd.DataFrame, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "parquet":
+        frame.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    if fmt != "csv":
+        raise ValueError(f"Unbekanntes Format {fmt!r}, erlaubt: {', '.join(PAYROLL_FORMATS)}")
+    # deutsches Zahlenformat; Personalnummer bleibt Text mit führenden Nullen
+    text = frame.to_csv(sep=";", decimal=",", float_format="%.2f", date_format="%d.%m.%Y", index=False)
+    return text.encode("utf-8-sig")
+
+def export_payroll(all_data: pd.DataFrame, fmt: str = "csv", details: bool = False,
+                   diagnostics: Optional[Diagnostics] = None, von: Optional[tuple] = None,
+                   bis: Optional[tuple] = None, register: Optional[PersonalRegister] = None,
+                   cube: Optional[pd.DataFrame] = None) -> list:
+    # [(Teil, bytes)]: "uebersicht" immer, "touren" mit details; cube wie bei export_report
+    diagnostics = diagnostics or Diagnostics()
+    register = register or current_personal_register()
+    with diagnostics.stage("payroll", format=fmt, rows=len(all_data), details=details):
+        with diagnostics.stage("select") as record:
+            all_data = select_months(all_data, von, bis)
+            cube = None if cube is None else select_months(cube, von, bis)
+            record["rows"] = len(all_data)
+        parts = [("uebersicht", payroll_bytes(payroll_summary(all_data, diagnostics, register, cube), fmt))]
+        if details:
+            with diagnostics.stage("details", rows=len(all_data)):
+                parts.append(("touren", payroll_bytes(payroll_details(all_data, register), fmt)))
+    return parts
 
-    lab = sheet.cell(row=total_row, column=start_col, value="GESAMTSUMME")
-    lab.font = Font(bold=True, size=12, color="FFFFFF")
-    lab.alignment = Alignment(horizontal="right", vertical="center")
-    lab.fill = total_fill
-    lab.border = medium_border
+# -------------------------------
+# Bibliotheks-API (ohne Streamlit, für App und Batch-Lauf)
+# -------------------------------
+EXCEL_SUFFIXES = (".xlsx", ".xls")
+
+def collect_input_files(inputs: list) -> list:
+    # Verzeichnisse, Glob-Muster oder einzelne Dateien -> sortierte, eindeutige Pfade
+    paths = []
+    for entry in inputs:
+        entry = os.path.expanduser(str(entry))
+        if os.path.isdir(entry):
+            candidates = [p for p in Path(entry).iterdir() if p.suffix.lower() in EXCEL_SUFFIXES]
+        elif glob.has_magic(entry):
+            candidates = [Path(p) for p in glob.glob(entry, recursive=True)]
+        else:
+            candidates = [Path(entry)]
+        # Excel-Sperrdateien (~$...) überspringen
+        paths.extend(sorted(p for p in candidates if not p.name.startswith("~$")))
+    return list(dict.fromkeys(paths))
 
-    empty_cell = sheet.cell(row=total_row, column=start_col + 1, value="")
-    empty_cell.fill = total_fill
-    empty_cell.border = medium_border
+def read_input_files(paths: list) -> list:
+    return [(Path(p).name, Path(p).read_bytes()) for p in paths]
 
-    sumcell = sheet.cell(row=total_row, column=start_col + 2, value=sum(x[2] for x in summary_data))
-    sumcell.number_format = '#,##0.00 €'
-    sumcell.font = Font(bold=True, size=12, color="FFFFFF")
-    sumcell.fill = total_fill
-    sumcell.border = medium_border
-    sumcell.alignment = Alignment(horizontal="right", vertical="center")
+def combine_results(results: list) -> pd.DataFrame:
+    frames = [result.data for result in results if result.data is not None]
+    return compact_tours(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
 
-    for row in range(2, total_row + 1):
-        sheet.row_dimensions[row].height = 22
+# -------------------------------
+# Hintergrund-Aufträge (Einlesen/Export ohne blockierte Oberfläche)
+# -------------------------------
+class JobCancelled(Exception):
+    pass
+
+class BackgroundJob:
+    # func(*args, progress=..., **kwargs) in einem Thread; progress(fertig, gesamt, name)
+    # meldet den Stand und bricht nach cancel() mit JobCancelled ab (zwischen Dateien/Blättern).
+    # Thread statt Prozess: Ergebnis (DataFrame/bytes) bleibt ohne Pickle im Speicher,
+    # das Einlesen verteilt ingest_files ohnehin auf Prozesse.
+    def __init__(self, func, *args, label: str = "", **kwargs):
+        self.label = label
+        self.diagnostics = Diagnostics()
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.fraction = 0.0
+        self.text = label
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+
+    def start(self) -> "BackgroundJob":
+        self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._thread.join(timeout)
+        return self.done
+
+    @property
+    def done(self) -> bool:
+        return self._thread.ident is not None and not self._thread.is_alive()
+
+    @property
+    def cancelled(self) -> bool:
+        return isinstance(self.error, JobCancelled)
+
+    def _step(self, done: int, total: int, name: str = "") -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+        self.fraction = min(done / total, 1.0) if total else 1.0
+        self.text = f"{self.label}: {name} ({done}/{total})" if name else f"{self.label} ({done}/{total})"
+
+    def _run(self, func, args, kwargs) -> None:
+        try:
+            if self._cancel.is_set():
+                raise JobCancelled(self.label)
+            self.result = func(*args, progress=self._step, diagnostics=self.diagnostics, **kwargs)
+            self.fraction = 1.0
+        except Exception as e:
+            self.error = e
 
-    sheet.column_dimensions[get_column_letter(start_col)].width = 28
-    sheet.column_dimensions[get_column_letter(start_col + 1)].width = 20
-    sheet.column_dimensions[get_column_letter(start_col + 2)].width = 22
+# -------------------------------
+# Batch-Lauf (Kommandozeile, z. B. für cron)
+# -------------------------------
+def _parse_period(text: str) -> tuple:
+    try:
+        jahr, monat = (int(part) for part in text.split("-"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Zeitraum {text!r} muss die Form JJJJ-MM haben")
+    if not 1 <= monat <= 12:
+        raise argparse.ArgumentTypeError(f"Ungültiger Monat in {text!r}")
+    return jahr, monat
+
+def cli(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Zulage Sonderfahrzeuge: Touren-Exporte einlesen und Auswertung als Excel schreiben.",
+    )
+    parser.add_argument("inputs", nargs="*", help="Verzeichnisse, Glob-Muster oder Excel-Dateien")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Pfad der Auswertung (.xlsx, oder .csv/.parquet für den Lohn-Import)")
+    parser.add_argument("--format", choices=("xlsx",) + PAYROLL_FORMATS,
+                        help="Ausgabeformat (Standard: nach Dateiendung von --output)")
+    parser.add_argument("--details", action="store_true",
+                        help="bei CSV/Parquet zusätzlich alle Touren nach <name>_touren.<endung>")
+    parser.add_argument("--engine", choices=("openpyxl", "xlsxwriter"), default=EXPORT_ENGINE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="Worker-Prozesse (Standard: Anzahl CPUs, 1 = ohne Prozesse)")
+    parser.add_argument("--fleet", default=FLEET_REGISTRY_PATH, metavar="PFAD",
+                        help="Fuhrpark-Datei (CSV/YAML), fehlt sie, gelten die eingebauten Fahrzeuge")
+    parser.add_argument("--personal", default=PERSONAL_REGISTER_PATH, metavar="PFAD",
+                        help="Mitarbeiterliste (CSV/Excel), fehlt sie, gilt die eingebaute Liste")
+    # Pfad als eigene Option: "--store PFAD" würde sonst die nächste Eingabedatei schlucken
+    parser.add_argument("--store", action="store_true",
+                        help="Touren im Tourenspeicher ablegen und die Auswertung daraus erstellen")
+    parser.add_argument("--store-path", metavar="PFAD",
+                        help=f"SQLite-Datei des Tourenspeichers (setzt --store, Standard: {TOUR_STORE_PATH})")
+    parser.add_argument("--von", type=_parse_period, metavar="JJJJ-MM", help="erster Monat der Auswertung")
+    parser.add_argument("--bis", type=_parse_period, metavar="JJJJ-MM", help="letzter Monat der Auswertung")
+    parser.add_argument("--overview-only", action="store_true", help="je Monat nur die Übersichtstabelle schreiben")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, metavar="N",
+                        help="Dateien blockweise zu N Zeilen einlesen (weniger Speicher bei großen Exporten)")
+    parser.add_argument("--diagnostics", metavar="PFAD", help="Laufzeiten je Stufe als JSON schreiben")
+    parser.add_argument("--profile", metavar="PFAD", help="cProfile-Datei (.prof) schreiben, liest ohne Worker-Prozesse")
+    args = parser.parse_args(argv)
+    args.store = args.store or args.store_path is not None
+    args.store_path = args.store_path or TOUR_STORE_PATH
+
+    if not args.inputs and not args.store:
+        parser.error("Keine Eingabedateien angegeben")
+    if args.chunk_rows is not None and args.chunk_rows < 1:
+        parser.error("--chunk-rows muss mindestens 1 sein")
+    args.format = args.format or _output_format(args.output)
+    if args.details and args.format == "xlsx":
+        parser.error("--details gibt es nur für CSV/Parquet")
+    if args.von and args.bis and args.von > args.bis:
+        parser.error("--von liegt nach --bis")
+
+    diagnostics = Diagnostics()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        args.workers = 1
+        profiler.enable()
+    try:
+        return _run_batch(args, diagnostics)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.diagnostics:
+            Path(args.diagnostics).write_text(diagnostics.to_json(), encoding="utf-8")
+
+def _output_format(output: str) -> str:
+    suffix = Path(output).suffix.lower().lstrip(".")
+    return suffix if suffix in PAYROLL_FORMATS else "xlsx"
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # erst vollständig schreiben, dann umbenennen (keine halben Dateien für Folgejobs)
+    partial = path.with_name(path.name + ".part")
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+def _run_batch(args: argparse.Namespace, diagnostics: Diagnostics) -> int:
+    paths = collect_input_files(args.inputs)
+    if args.inputs and not paths:
+        print("Keine Excel-Dateien gefunden.", file=sys.stderr)
+        return 2
+
+    try:
+        table = current_rate_table(args.fleet)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Fuhrpark-Datei {args.fleet} fehlerhaft: {e}", file=sys.stderr)
+        return 2
+    try:
+        register = current_personal_register(args.personal)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Mitarbeiterliste {args.personal} fehlerhaft: {e}", file=sys.stderr)
+        return 2
+    store = None
+    if args.store:
+        try:
+            store = TourStore(args.store_path)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Tourenspeicher {args.store_path} nicht nutzbar: {e}", file=sys.stderr)
+            return 2
+
+    # zwischen Läufen hilft nur der Festplatten-Cache (ZULAGE_CACHE_DIR)
+    cache = UploadCache() if UPLOAD_CACHE_DIR else None
+    # nur für die Übersicht reichen Teilsummen je Monat, der Tourenspeicher braucht die Touren
+    summary_only = args.overview_only if args.format == "xlsx" else not args.details
+    totals_only = bool(args.chunk_rows) and summary_only and not args.store
+    results = ingest_files(read_input_files(paths), workers=args.workers, cache=cache, diagnostics=diagnostics,
+                           table=table, chunk_rows=args.chunk_rows, totals_only=totals_only)
+    failed = False
+    for result in results:
+        for level, text in result.messages:
+            failed = failed or level == "error"
+            print(f"{level.upper()}: {text}", file=sys.stderr)
+
+    if store is not None:
+        try:
+            for result in results:
+                if result.data is not None:
+                    added = store.add(result.data, quelle=result.name)
+                    print(f"{result.name}: {added} neue Touren gespeichert", file=sys.stderr)
+            all_data = store.load(args.von, args.bis, table)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Tourenspeicher {args.store_path} nicht nutzbar: {e}", file=sys.stderr)
+            return 2
+    else:
+        all_data = combine_results(results)
+    # Zeitraum vor der Prüfung auf leere Daten: leere Auswahl = Exit-Code 1 wie mit --store
+    all_data = select_months(all_data, args.von, args.bis)
+
+    if all_data.empty:
+        if args.von or args.bis:
+            print("Keine Touren im gewählten Zeitraum.", file=sys.stderr)
+        else:
+            print("Keine Daten gefunden (nach AZ-Filter & Datum >= 01.01.2025).", file=sys.stderr)
+        return 1
+
+    output = Path(args.output)
+    if args.format == "xlsx":
+        report = export_report(all_data, engine=args.engine, diagnostics=diagnostics, von=args.von, bis=args.bis,
+                               overview_only=args.overview_only, register=register)
+        _write_atomic(output, report)
+    else:
+        parts = export_payroll(all_data, args.format, details=args.details, diagnostics=diagnostics,
+                               von=args.von, bis=args.bis, register=register)
+        for teil, data in parts:
+            _write_atomic(output if teil == "uebersicht" else output.with_name(f"{output.stem}_{teil}{output.suffix}"),
+                          data)
+    touren = int(all_data["Touren"].sum()) if is_month_totals(all_data) else len(all_data)
+    print(f"{touren} Touren -> {output}", file=sys.stderr)
+    unresolved = unresolved_drivers(all_data, register)
+    if not unresolved.empty:
+        print(f"{len(unresolved)} Fahrer ohne Personalnummer:", file=sys.stderr)
+        for row in unresolved.itertuples(index=False):
+            print(f"  {row.Nachname}, {row.Vorname}: {row.Touren} Touren ({row.Monate})", file=sys.stderr)
+    return 3 if failed else 0
 
 # -------------------------------
 # App
 # -------------------------------
+def _new_upload_cache() -> UploadCache:
+    # bleibt über Reruns und Sessions hinweg erhalten (st.cache_resource)
+    return UploadCache()
+
 def main():
+    # Streamlit erst hier laden, Bibliothek und Batch-Lauf kommen ohne aus
+    import streamlit as st
+
     st.title("Zulage - Sonderfahrzeuge - Ab 2025")
 
+    show_diagnostics = st.sidebar.checkbox(
+        "Diagnose anzeigen",
+        help="Laufzeit, Zeilen und Speicher je Stufe, Datei und Monatsblatt",
+    )
+    # ein einzelner Lauf mit cProfile (ohne Worker-Prozesse, die würden nicht mit erfasst)
+    profiler = None
+    if show_diagnostics and st.sidebar.button("Nächsten Lauf profilieren (cProfile)"):
+        profiler = cProfile.Profile()
+
+    diagnostics = Diagnostics()
+    if profiler:
+        profiler.enable()
+    try:
+        _run_report(st, diagnostics, workers=1 if profiler else INGEST_WORKERS)
+    finally:
+        if profiler:
+            profiler.disable()
+            st.session_state["zulage_profile"] = (profile_stats_text(profiler), profile_dump(profiler))
+
+    if show_diagnostics:
+        _show_diagnostics(st, diagnostics)
+
+def _run_report(st, diagnostics: Diagnostics, workers: Optional[int]) -> None:
+    # Fuhrpark und Mitarbeiterliste nur neu einlesen, wenn sich die Datei geändert hat (mtime/Größe)
+    stamp = file_stamp(FLEET_REGISTRY_PATH)
+    try:
+        table = RATE_TABLE if stamp is None else st.cache_resource(load_fleet_registry)(FLEET_REGISTRY_PATH, stamp)
+    except (OSError, ValueError, ImportError) as e:
+        st.error(f"Fuhrpark-Datei {FLEET_REGISTRY_PATH} fehlerhaft: {e}")
+        return
+    st.sidebar.caption(f"Fuhrpark: {Path(FLEET_REGISTRY_PATH).name if stamp else 'eingebaute Liste'} "
+                       f"({len(table.nummern)} Einträge)")
+
+    personal_stamp = file_stamp(PERSONAL_REGISTER_PATH)
+    try:
+        register = (BUILTIN_PERSONAL_REGISTER if personal_stamp is None else
+                    st.cache_resource(load_personal_register)(PERSONAL_REGISTER_PATH, personal_stamp))
+    except (OSError, ValueError, ImportError) as e:
+        st.error(f"Mitarbeiterliste {PERSONAL_REGISTER_PATH} fehlerhaft: {e}")
+        return
+    st.sidebar.caption(f"Mitarbeiter: {Path(PERSONAL_REGISTER_PATH).name if personal_stamp else 'eingebaute Liste'} "
+                       f"({len(register)} Einträge)")
+
     uploaded_files = st.file_uploader(
         "Lade eine oder mehrere Excel-Dateien hoch",
         type=["xlsx", "xls"],
         accept_multiple_files=True
     )
 
-    if uploaded_files:
-        all_data = pd.DataFrame()
-
-        for uploaded_file in uploaded_files:
-            try:
-                df = pd.read_excel(uploaded_file, sheet_name="Touren", header=0)
-
-                # AZ-Zeilen filtern (Spalte 14 -> Index 13)
-                mask = df.iloc[:, 13].astype(str).str.contains(r'(?i)\bAZ\b', na=False)
-                filtered_df = df[mask].copy()
-
-                if not filtered_df.empty:
-                    filtered_df["Datum"] = pd.to_datetime(filtered_df.iloc[:, 14], format="%d.%m.%Y", errors="coerce")
-                    filtered_df = filtered_df[filtered_df["Datum"] >= pd.Timestamp("2025-01-01")]
-
-                if filtered_df.empty:
-                    st.warning(f"Keine passenden Daten in der Datei {uploaded_file.name} gefunden.")
-                    continue
-
-                # ------------------------------------------------------------
-                # NAMENLOGIK (wie gewünscht):
-                # - Wenn D und E voll -> D/E verwenden
-                # - Wenn D und E leer -> G/H verwenden
-                # - NICHT beide nehmen
-                # ------------------------------------------------------------
-                # 0=Tour, 3=D Nachname, 4=E Vorname, 6=G Nachname2, 7=H Vorname2,
-                # 10=LKW1, 11=LKW, 12=Art, 14=Datum
-                columns_to_extract = [0, 3, 4, 6, 7, 10, 11, 12, 14]
-                tmp = filtered_df.iloc[:, columns_to_extract].copy()
-                tmp.columns = ["Tour", "Nachname_DE", "Vorname_DE", "Nachname_GH", "Vorname_GH", "LKW1", "LKW", "Art", "Datum"]
-
-                def _clean_cell(x) -> str:
-                    if pd.isna(x):
-                        return ""
-                    return str(x).replace("\u00a0", " ").strip()
-
-                for c in ["Nachname_DE", "Vorname_DE", "Nachname_GH", "Vorname_GH"]:
-                    tmp[c] = tmp[c].apply(_clean_cell)
-
-                rows = []
-                for _, r in tmp.iterrows():
-                    de_ok = (r["Nachname_DE"] != "" and r["Vorname_DE"] != "")
-                    if de_ok:
-                        nn, vn = r["Nachname_DE"], r["Vorname_DE"]
-                    else:
-                        # nur wenn D/E leer -> G/H
-                        nn, vn = r["Nachname_GH"], r["Vorname_GH"]
-
-                    # Wenn auch G/H leer ist -> Zeile überspringen
-                    if (nn == "" or vn == ""):
-                        continue
-
-                    rows.append({
-                        "Tour": r["Tour"],
-                        "Nachname": nn,
-                        "Vorname": vn,
-                        "LKW1": r["LKW1"],
-                        "LKW": r["LKW"],
-                        "Art": r["Art"],
-                        "Datum": r["Datum"],
-                    })
-
-                extracted = pd.DataFrame(rows)
-
-                if extracted.empty:
-                    st.warning(f"AZ gefunden, aber keine verwertbaren Namen (D/E oder G/H) in {uploaded_file.name}.")
-                    continue
-
-                # LKW normalisieren + Art bestimmen
-                extracted["LKW"] = extracted["LKW"].apply(lambda x: f"E-{x}" if pd.notnull(x) else x)
-                extracted["Art"] = extracted["LKW"].apply(
-                    lambda x: define_art(int(str(x).split("-")[1]))
-                    if pd.notnull(x) and "-" in str(x) and str(x).split("-")[1].isdigit()
-                    else "Unbekannt"
-                )
-
-                extracted["Datum"] = pd.to_datetime(extracted["Datum"], format="%d.%m.%Y", errors="coerce")
-
-                # Tour ggf. aus Spalte Q (Index 16)
-                if "Tour" in extracted.columns and filtered_df.shape[1] > 16:
-                    extracted["Tour"] = extracted["Tour"].fillna(filtered_df.iloc[:, 16])
-
-                # Verdienst
-                def calculate_earnings(row):
-                    earnings = 0
-                    candidates = []
-
-                    if pd.notnull(row["LKW1"]) and str(row["LKW1"]).isdigit():
-                        candidates.append(int(row["LKW1"]))
-
-                    if pd.notnull(row["LKW"]) and "-" in str(row["LKW"]):
-                        tail = str(row["LKW"]).split("-")[1]
-                        if tail.isdigit():
-                            candidates.append(int(tail))
-
-                    for v in candidates:
-                        if v in [602, 156]:
-                            earnings += 40
-                        elif v in [620, 350, 520, 266, 458, 548, 541, 542, 543, 558]:
-                            earnings += 20
-
-                    return earnings
-
-                extracted["Verdienst"] = extracted.apply(calculate_earnings, axis=1)
-                extracted["Monat"] = extracted["Datum"].dt.month
-                extracted["Jahr"] = extracted["Datum"].dt.year
+    use_store = st.sidebar.checkbox(
+        "Tourenspeicher verwenden",
+        help="Touren dauerhaft speichern (ohne Doppelte) und Auswertungen aus dem Speicher erstellen",
+    )
 
-                all_data = pd.concat([all_data, extracted], ignore_index=True)
+    chunk_rows = DEFAULT_CHUNK_ROWS if st.sidebar.checkbox(
+        "Große Dateien blockweise einlesen",
+        help=f"Liest je {DEFAULT_CHUNK_ROWS:,} Zeilen, braucht weniger Speicher, gleiches Ergebnis".replace(",", "."),
+    ) else CHUNK_ROWS
 
-            except Exception as e:
-                st.error(f"Fehler beim Einlesen der Datei {uploaded_file.name}: {e}")
+    background = st.sidebar.checkbox(
+        "Im Hintergrund erstellen",
+        help="Einlesen und Auswertung laufen weiter, während die Seite bedienbar bleibt; "
+             "mit Fortschritt, abbrechbar, fertige Auswertung bleibt bis zur nächsten Änderung erhalten",
+    )
 
-        if not all_data.empty:
-            output_file = "touren_auswertung_korrekt.xlsx"
+    loaded = []
+    if uploaded_files:
+        keys = _upload_keys(st, uploaded_files, table)
+        cache = st.cache_resource(_new_upload_cache)()
+        if background:
+            # Bytes nur beim Start lesen, nicht bei jeder Abfrage des laufenden Auftrags
+            job = _background(st, "ingest", (tuple(keys), chunk_rows), lambda: BackgroundJob(
+                ingest_files, [(f.name, f.getvalue()) for f in uploaded_files], label="Einlesen",
+                workers=workers, cache=cache, table=table, chunk_rows=chunk_rows, keys=keys))
+            if not _job_finished(st, st, "ingest", job):
+                if not job.done:
+                    _rerun_soon(st)
+                return
+            results = job.result
+            diagnostics.extend(job.diagnostics.records)
+        else:
+            results = ingest_files([(f.name, f.getvalue()) for f in uploaded_files], workers=workers, cache=cache,
+                                   diagnostics=diagnostics, table=table, chunk_rows=chunk_rows, keys=keys)
+
+        for key, result in zip(keys, results):
+            for level, text in result.messages:
+                getattr(st, level)(text)
+            if result.data is not None:
+                loaded.append((key, result))
+
+    if use_store:
+        store = TourStore()
+        # bei Reruns derselben Uploads nicht erneut einfügen
+        stored = st.session_state.setdefault("tour_store_added", {})
+        for key, result in loaded:
+            if key not in stored:
+                stored[key] = store.add(result.data, quelle=result.name)
+        if loaded:
+            added = sum(stored[key] for key, _ in loaded)
+            total = sum(len(result.data) for _, result in loaded)
+            st.success(f"{added} neue Touren gespeichert, {total - added} waren bereits im Speicher.")
+
+        periods = [jahr * 100 + monat for jahr, monat in store.months()]
+        if not periods:
+            if not uploaded_files:
+                st.info("Der Tourenspeicher ist noch leer.")
+            return
+        # aus dem Speicher nur die gewählten Monate laden
+        von, bis = _month_range_picker(st, periods)
+        with diagnostics.stage("store_load") as record:
+            all_data = store.load(von, bis, table)
+            record["rows"] = len(all_data)
+        # Speicher geändert (auch von anderen Sessions) -> neue Datei-Stempel;
+        # load rechnet Art/Verdienst mit dem aktuellen Fuhrpark -> dessen Fingerprint gehört dazu
+        cube_key = ("store", store.path, von, bis, file_stamp(store.path), file_stamp(store.path + "-wal"),
+                    table.fingerprint)
+    elif uploaded_files:
+        all_data = combine_results([result for _, result in loaded])
+        von, bis = _month_range_picker(st, month_periods(all_data))
+        cube_key = ("upload", tuple(key for key, _ in loaded), von, bis, table.fingerprint)
+    else:
+        return
+
+    if not all_data.empty:
+        with diagnostics.stage("cube") as record:
+            cube = _session_cube(st, cube_key, all_data, von, bis)
+            record["rows"] = len(cube)
+        # alle Fahrer ohne Personalnummer auf einmal, statt je Lauf einen zu finden
+        unresolved = unresolved_drivers(cube, register)
+        if not unresolved.empty:
+            st.warning(f"{len(unresolved)} Fahrer ohne Personalnummer (in der Auswertung als \"Unbekannt\"):")
+            st.dataframe(unresolved, hide_index=True)
+            st.download_button(
+                label="Liste für die Personalabteilung (CSV)",
+                data=unresolved.to_csv(sep=";", index=False).encode("utf-8-sig"),
+                file_name="unbekannte_fahrer.csv",
+                mime="text/csv",
+            )
+
+        overview_only = st.checkbox(
+            "Nur Übersicht (Auszahlung je Fahrer, ohne Tourenliste)",
+            help="Schreibt je Monat nur die Übersichtstabelle, deutlich schneller bei vielen Touren",
+        )
+        engine = "xlsxwriter" if st.checkbox(
+            "Speicherschonender Export (XlsxWriter, für große Mehrmonats-Auswertungen)"
+        ) else EXPORT_ENGINE
+        report_col, payroll_col = st.columns(2)
+        # fertige Mappe je Auswahl in der Session: Reruns (z. B. Filter der Diagramme) zeigen sofort den Download
+        key = (cube_key, engine, overview_only, register.fingerprint)
+        cached = st.session_state.get("zulage_report")
+        report = cached[1] if cached is not None and cached[0] == key else None
+        pending = False
+        if report is None and background:
+            job = _background(st, "report", key, lambda: BackgroundJob(
+                export_report, all_data, label="Auswertung", engine=engine, von=von, bis=bis,
+                overview_only=overview_only, register=register, cube=cube))
+            if _job_finished(st, report_col, "report", job):
+                report = job.result
+                diagnostics.extend(job.diagnostics.records)
+                st.session_state["zulage_report"] = (key, report)
+                st.session_state["zulage_jobs"].pop("report", None)
+            pending = not job.done
+        elif report is None:
             try:
-                with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-                    sorted_data = all_data.sort_values(by=["Jahr", "Monat", "Nachname", "Vorname"])
-
-                    for year, month in sorted_data[["Jahr", "Monat"]].drop_duplicates().values:
-                        month_data = sorted_data[
-                            (sorted_data["Jahr"] == year) & (sorted_data["Monat"] == month)
-                        ].copy()
-                        if month_data.empty:
-                            continue
-
-                        sheet_name = f"{get_german_month_name(month)} {year}"
-                        sheet_data = []
-                        summary_data = []
-
-                        for (nachname, vorname), group in month_data.groupby(["Nachname", "Vorname"], dropna=False):
-                            vn = (vorname or "").strip()
-                            nn = (nachname or "").strip()
-
-                            total_earnings = float(group["Verdienst"].sum())
-                            personalnummer = get_personalnummer(nn, vn)
-
-                            summary_data.append([f"{vn} {nn}".strip(), personalnummer, total_earnings])
-
-                            sheet_data.append([f"{vn} {nn}".strip(), "", "", "", ""])
-                            sheet_data.append(["Datum", "Tour", "LKW", "Art", "Verdienst"])
-
-                            for _, row in group.iterrows():
-                                dt = pd.to_datetime(row["Datum"]) if pd.notnull(row["Datum"]) else pd.NaT
-                                formatted_date = format_date_with_german_weekday(dt) if pd.notnull(dt) else ""
-                                sheet_data.append([
-                                    formatted_date,
-                                    row["Tour"],
-                                    row["LKW"],
-                                    row["Art"],
-                                    float(row["Verdienst"])
-                                ])
-
-                            sheet_data.append(["Gesamtverdienst", "", "", "", total_earnings])
-                            sheet_data.append([])
-
-                        pd.DataFrame(sheet_data).to_excel(writer, index=False, sheet_name=sheet_name[:31])
-                        sheet = writer.sheets[sheet_name[:31]]
-
-                        add_summary(sheet, summary_data, start_col=9, month_name=sheet_name)
-                        apply_styles(sheet)
-
-                with open(output_file, "rb") as fh:
-                    st.download_button(
-                        label="Download Auswertung",
-                        data=fh,
-                        file_name="Zulage_Sonderfahrzeuge_2025.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                report = export_report(all_data, engine=engine, diagnostics=diagnostics, von=von, bis=bis,
+                                       overview_only=overview_only, register=register, cube=cube)
+                st.session_state["zulage_report"] = (key, report)
             except Exception as e:
                 st.error(f"Fehler beim Exportieren der Datei: {e}")
+        if report is not None:
+            report_col.download_button(
+                label="Download Auswertung",
+                data=report,
+                file_name="Zulage_Sonderfahrzeuge_2025.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+
+        # Lohn-Import: nur die Zahlen der Übersicht (optional alle Touren), ohne Formatierung
+        payroll_format = payroll_col.radio("Lohn-Import", PAYROLL_FORMATS, horizontal=True, format_func=str.upper)
+        details = payroll_col.checkbox("mit allen Touren (eigene Datei)")
+        payroll_key = (cube_key, payroll_format, details, register.fingerprint)
+        cached = st.session_state.get("zulage_payroll")
+        try:
+            if cached is None or cached[0] != payroll_key:
+                cached = (payroll_key, export_payroll(all_data, payroll_format, details=details,
+                                                      diagnostics=diagnostics, von=von, bis=bis,
+                                                      register=register, cube=cube))
+                st.session_state["zulage_payroll"] = cached
+            for teil, data in cached[1]:
+                payroll_col.download_button(
+                    label=f"Download Lohn-Import {teil.capitalize()} ({payroll_format.upper()})",
+                    data=data,
+                    file_name=f"Zulage_Sonderfahrzeuge_2025_{teil}.{payroll_format}",
+                    mime="text/csv" if payroll_format == "csv" else "application/vnd.apache.parquet",
+                )
+        except Exception as e:
+            st.error(f"Fehler beim Lohn-Import-Export: {e}")
+
+        _show_charts(st, cube)
+        # erst die ganze Seite zeigen, dann auf den Export warten
+        if pending:
+            _rerun_soon(st)
+    else:
+        st.info("Keine Daten gefunden (nach AZ-Filter & Datum >= 01.01.2025).")
+
+# Abstand, in dem die Seite den Stand eines Hintergrund-Auftrags abfragt (Sekunden)
+JOB_POLL_SECONDS = 0.5
+
+def _background(st, slot: str, key: tuple, new_job) -> BackgroundJob:
+    # ein Auftrag je Platz ("ingest", "report") und Session; neue Eingaben brechen den alten ab.
+    # new_job() legt den Auftrag erst an, wenn er wirklich neu startet (Uploads nicht bei jeder Abfrage kopieren)
+    jobs = st.session_state.setdefault("zulage_jobs", {})
+    current = jobs.get(slot)
+    if current is None or current[0] != key:
+        if current is not None:
+            current[1].cancel()
+        current = (key, new_job().start())
+        jobs[slot] = current
+    return current[1]
+
+def _job_finished(st, container, slot: str, job: BackgroundJob) -> bool:
+    # Fortschritt bzw. Abbruch/Fehler anzeigen; True, sobald das Ergebnis da ist
+    if not job.done:
+        container.progress(job.fraction, text=job.text)
+        if container.button("Abbrechen", key=f"zulage_cancel_{slot}"):
+            job.cancel()
+        return False
+    if job.error is None:
+        return True
+    if job.cancelled:
+        container.info(f"{job.label} abgebrochen.")
+    else:
+        container.error(f"Fehler bei {job.label}: {job.error}")
+    if container.button("Erneut starten", key=f"zulage_restart_{slot}"):
+        st.session_state["zulage_jobs"].pop(slot, None)
+        _rerun_soon(st, 0)
+    return False
+
+def _rerun_soon(st, seconds: float = JOB_POLL_SECONDS) -> None:
+    time.sleep(seconds)
+    # st.rerun erst ab Streamlit 1.27
+    rerun = getattr(st, "rerun", None) or st.experimental_rerun
+    rerun()
+
+def _upload_keys(st, uploaded_files: list, table: RateTable) -> list:
+    # upload_cache_key je Upload nur einmal hashen: file_id bleibt über Reruns gleich
+    memo = st.session_state.get("zulage_upload_keys", {})
+    current, keys = {}, []
+    for f in uploaded_files:
+        # file_id ab Streamlit 1.28, davor id
+        file_id = getattr(f, "file_id", None) or getattr(f, "id", None)
+        memo_key = (file_id, f.name, getattr(f, "size", None), table.fingerprint)
+        key = memo.get(memo_key) if file_id is not None else None
+        if key is None:
+            key = upload_cache_key(f.getvalue(), table)
+        current[memo_key] = key
+        keys.append(key)
+    # nur die aktuellen Uploads merken
+    st.session_state["zulage_upload_keys"] = current
+    return keys
+
+def _session_cube(st, key: tuple, all_data: pd.DataFrame, von: Optional[tuple], bis: Optional[tuple]) -> pd.DataFrame:
+    # Würfel je Auswahl in der Session merken: Filter der Diagramme lösen nur einen Rerun aus
+    cached = st.session_state.get("zulage_cube")
+    if cached is None or cached[0] != key:
+        cached = (key, as_cube(select_months(all_data, von, bis)))
+        st.session_state["zulage_cube"] = cached
+    return cached[1]
+
+def _show_charts(st, cube: pd.DataFrame) -> None:
+    import altair as alt
+
+    with st.expander("Diagramme"):
+        kennzahl = st.radio("Kennzahl", ["Zulage (€)", "Touren"], horizontal=True)
+        spalte = "Verdienst" if kennzahl == "Zulage (€)" else "Touren"
+        arten = sorted(str(a) for a in cube["Art"].unique())
+        gewaehlt = st.multiselect("Fahrzeugart", arten, default=arten)
+        anzahl = st.slider("Fahrer im Ranking", 5, 50, 15)
+
+        data = cube[cube["Art"].astype(str).isin(gewaehlt)]
+        if data.empty:
+            st.info("Keine Touren für die gewählten Fahrzeugarten.")
+            return
+
+        monate = data.groupby(["Jahr", "Monat", "Art"], sort=True, observed=True)[spalte].sum().reset_index()
+        monate["Periode"] = [f"{jahr}-{monat:02d}" for jahr, monat in zip(monate["Jahr"], monate["Monat"])]
+        monate["Art"] = monate["Art"].astype(str)
+        st.altair_chart(
+            alt.Chart(monate).mark_bar().encode(
+                x=alt.X("Periode:O", title="Monat"),
+                y=alt.Y(f"{spalte}:Q", title=kennzahl),
+                color=alt.Color("Art:N", title="Fahrzeugart"),
+                tooltip=["Periode", "Art", alt.Tooltip(f"{spalte}:Q", title=kennzahl)],
+            )
+        )
+
+        groups = data.groupby(driver_keys(data), sort=True)
+        fahrer = pd.DataFrame({
+            "Fahrer": [f"{vn} {nn}".strip() for nn, vn in zip(groups["Nachname"].first(), groups["Vorname"].first())],
+            spalte: groups[spalte].sum().to_numpy(),
+        }).nlargest(anzahl, spalte)
+        st.altair_chart(
+            alt.Chart(fahrer).mark_bar().encode(
+                x=alt.X(f"{spalte}:Q", title=kennzahl),
+                y=alt.Y("Fahrer:N", sort="-x", title=None),
+                tooltip=["Fahrer", alt.Tooltip(f"{spalte}:Q", title=kennzahl)],
+            )
+        )
+
+def _month_range_picker(st, periods: list) -> tuple:
+    # Monate als JJJJMM -> ((Jahr, Monat), (Jahr, Monat)), bei nur einem Monat ohne Auswahl
+    if len(periods) < 2:
+        return None, None
+    von, bis = st.select_slider(
+        "Zeitraum",
+        options=periods,
+        value=(periods[0], periods[-1]),
+        format_func=lambda p: f"{get_german_month_name(p % 100)} {p // 100}",
+    )
+    return divmod(von, 100), divmod(bis, 100)
+
+def _show_diagnostics(st, diagnostics: Diagnostics) -> None:
+    with st.expander("Diagnose", expanded=True):
+        if diagnostics.records:
+            st.dataframe(diagnostics.summary(), hide_index=True)
+            st.dataframe(pd.DataFrame(diagnostics.records), hide_index=True)
+            st.download_button(
+                label="Diagnose als JSON",
+                data=diagnostics.to_json(),
+                file_name="zulage_diagnose.json",
+                mime="application/json",
+            )
         else:
-            st.info("Keine Daten gefunden (nach AZ-Filter & Datum >= 01.01.2025).")
+            st.caption("Noch keine Messwerte, bitte Dateien hochladen.")
+
+        profile = st.session_state.get("zulage_profile")
+        if profile:
+            text, dump = profile
+            st.code(text)
+            st.download_button(label="cProfile-Datei (.prof)", data=dump, file_name="zulage.prof",
+                               mime="application/octet-stream")
 
 if __name__ == "__main__":
-    main()
+    # "streamlit run" hat Streamlit bereits geladen, sonst Kommandozeile
+    if "streamlit" in sys.modules:
+        main()
+    else:
+        sys.exit(cli())
@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# Modul liegt im Projektordner, nicht als Paket installiert; Generator für Testmappen in benchmarks/
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+@pytest.fixture(scope="session")
+def touren_mappe(tmp_path_factory):
+    from touren_generator import write_workbook
+
+    return write_workbook(tmp_path_factory.mktemp("touren") / "touren_1000.xlsx", 1000, seed=7)
@@ -0,0 +1,26 @@
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from sonderzulage_berechnung import FileResult, UploadCache, extract_file_bytes, upload_cache_key
+
+def test_festplatten_cache_parquet_ohne_pickle(tmp_path, touren_mappe):
+    data = touren_mappe.read_bytes()
+    result = extract_file_bytes(touren_mappe.name, data)
+    # Tour aus Spalte Q: Zahlen und Text in einer Spalte
+    assert {type(v) for v in result.data["Tour"].dropna()} >= {float, str}
+    key = upload_cache_key(data)
+    UploadCache(directory=str(tmp_path)).put(key, result)
+
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".json", ".parquet"]
+    cached = UploadCache(directory=str(tmp_path)).get(key)
+    assert_frame_equal(cached.data, result.data, check_exact=True)
+    assert [type(v) for v in cached.data["Tour"]] == [type(v) for v in result.data["Tour"]]
+
+def test_gemischte_spalte_mit_int_float_none(tmp_path):
+    frame = pd.DataFrame({"Tour": pd.Series([1234, 1234.0, "Q12", None, float("nan"), True], dtype=object),
+                          "Verdienst": [1, 2, 3, 4, 5, 6]})
+    cache = UploadCache(directory=str(tmp_path))
+    cache.put("k", FileResult("x.xlsx", frame, []))
+    cached = UploadCache(directory=str(tmp_path)).get("k")
+    assert_frame_equal(cached.data, frame)
+    assert [type(v) for v in cached.data["Tour"]] == [int, float, str, type(None), float, bool]
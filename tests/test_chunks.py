@@ -0,0 +1,31 @@
+from openpyxl import Workbook
+from pandas.testing import assert_frame_equal
+
+from sonderzulage_berechnung import (aggregation_cube, extract_file, extract_file_chunked, finalize_tours,
+                                     read_touren, resolve_driver_names)
+
+def test_tour_aus_spalte_q_derselben_zeile(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Touren"
+    sheet.append([f"Spalte {i + 1}" for i in range(18)])
+    for tour, nachname, q in [(None, "Adler", "Q1"), (4711, "Baum", "Q2"), (None, "Krause", "Q3")]:
+        row = [None] * 18
+        row[0], row[3], row[4], row[11], row[13], row[14], row[16] = tour, nachname, "Uwe", 602, "AZ", "02.01.2025", q
+        sheet.append(row)
+    # Zeile ohne AZ davor verschiebt die Zeilennummern gegenüber den Positionen
+    sheet.insert_rows(2)
+    sheet["N2"], sheet["O2"], sheet["Q2"] = "Frei", "01.01.2025", "Q0"
+    workbook.save(tmp_path / "q.xlsx")
+
+    extracted = finalize_tours(resolve_driver_names(read_touren(tmp_path / "q.xlsx")))
+    assert extracted["Tour"].tolist() == ["Q1", 4711, "Q3"]
+    assert "Tour_Q" not in extracted.columns
+
+def test_blockweise_wie_am_stueck(touren_mappe):
+    full = extract_file(touren_mappe, touren_mappe.name)
+    for chunk_rows in (50, 500):
+        chunked = extract_file_chunked(touren_mappe, touren_mappe.name, chunk_rows=chunk_rows)
+        assert_frame_equal(full.data, chunked.data, check_exact=True)
+        totals = extract_file_chunked(touren_mappe, touren_mappe.name, chunk_rows=chunk_rows, totals_only=True)
+        assert_frame_equal(aggregation_cube(full.data), totals.data, check_exact=True)
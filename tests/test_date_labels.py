@@ -0,0 +1,14 @@
+import pandas as pd
+
+from sonderzulage_berechnung import format_date_labels, format_date_with_german_weekday
+
+def test_format_date_labels_wie_einzeln_2025_bis_2030():
+    tage = pd.date_range("2025-01-01", "2030-12-31")
+    # unsortiert, doppelt und mit NaT wie in einem Monatsblatt
+    dates = pd.Series(list(tage[::-1]) + [pd.NaT] + list(tage[:10]))
+    expected = [format_date_with_german_weekday(d) for d in tage[::-1]] + [""] + \
+               [format_date_with_german_weekday(d) for d in tage[:10]]
+    assert format_date_labels(dates).tolist() == expected
+
+def test_format_date_labels_nur_nat():
+    assert format_date_labels(pd.Series([pd.NaT, pd.NaT])).tolist() == ["", ""]
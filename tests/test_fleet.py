@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sonderzulage_berechnung import (
+    ZULAGE_JE_ART, FleetEntry, compile_fleet, current_rate_table, lookup_rates, read_fleet_registry,
+)
+
+T = pd.Timestamp
+
+def _rates(table, nummer: int, daten: list) -> list:
+    art_index, zulage = lookup_rates(table, [nummer] * len(daten), pd.to_datetime(daten))
+    return [(table.arten[a], int(z)) for a, z in zip(art_index, zulage)]
+
+# -------------------------------
+# Gültigkeitszeiträume
+# -------------------------------
+def test_grenzen_einschliesslich():
+    table = compile_fleet([FleetEntry(602, "Gigaliner", 40, T("2025-02-01"), T("2025-02-28"))])
+    assert _rates(table, 602, ["2025-01-31", "2025-02-01", "2025-02-28", "2025-03-01"]) == [
+        ("Unbekannt", 0), ("Gigaliner", 40), ("Gigaliner", 40), ("Unbekannt", 0)]
+
+def test_uhrzeit_zaehlt_zum_tag():
+    table = compile_fleet([FleetEntry(602, "Gigaliner", 40, T("2025-02-01"), T("2025-02-28"))])
+    assert _rates(table, 602, ["2025-02-28 23:59", "2025-03-01 00:00"]) == [("Gigaliner", 40), ("Unbekannt", 0)]
+
+def test_zeitraeume_direkt_hintereinander():
+    table = compile_fleet([
+        FleetEntry(602, "Tandem", 20, None, T("2025-03-31")),
+        FleetEntry(602, "Gigaliner", 40, T("2025-04-01"), T("2025-06-30")),
+        FleetEntry(602, "Gigaliner", 45, T("2025-07-01"), None),
+        FleetEntry(350, "Tandem", 20),
+    ])
+    assert _rates(table, 602, ["2024-01-01", "2025-03-31", "2025-04-01", "2025-06-30", "2025-07-01", "2030-01-01"]) == [
+        ("Tandem", 20), ("Tandem", 20), ("Gigaliner", 40), ("Gigaliner", 40), ("Gigaliner", 45), ("Gigaliner", 45)]
+    assert _rates(table, 350, ["2025-04-01"]) == [("Tandem", 20)]
+
+def test_luecke_zwischen_zeitraeumen():
+    table = compile_fleet([
+        FleetEntry(602, "Tandem", 20, None, T("2025-03-31")),
+        FleetEntry(602, "Gigaliner", 40, T("2025-05-01"), None),
+    ])
+    assert _rates(table, 602, ["2025-04-15"]) == [("Unbekannt", 0)]
+
+def test_ohne_datum_nur_offener_beginn():
+    table = compile_fleet([
+        FleetEntry(602, "Tandem", 20, None, T("2025-03-31")),
+        FleetEntry(602, "Gigaliner", 40, T("2025-04-01"), None),
+        FleetEntry(350, "Tandem", 20, T("2025-01-01"), None),
+        FleetEntry(156, "Gigaliner", 40),
+    ])
+    assert _rates(table, 602, [pd.NaT]) == [("Tandem", 20)]
+    assert _rates(table, 350, [pd.NaT]) == [("Unbekannt", 0)]
+    assert _rates(table, 156, [pd.NaT]) == [("Gigaliner", 40)]
+
+def test_unbekannte_und_fehlende_nummern():
+    table = compile_fleet([FleetEntry(602, "Gigaliner", 40)])
+    art_index, zulage = lookup_rates(table, np.array([-1, 0, 601, 603, 2 ** 39]), [T("2025-01-01")] * 5)
+    assert list(art_index) == [0] * 5 and list(zulage) == [0] * 5
+
+@pytest.mark.parametrize("entries", [
+    [FleetEntry(602, "Tandem", 20, None, T("2025-03-31")), FleetEntry(602, "Gigaliner", 40, T("2025-03-31"), None)],
+    [FleetEntry(602, "Tandem", 20), FleetEntry(602, "Gigaliner", 40, T("2025-04-01"), None)],
+    [FleetEntry(602, "Tandem", 20, T("2025-01-01"), T("2025-12-31")),
+     FleetEntry(602, "Gigaliner", 40, T("2025-06-01"), T("2025-06-30"))],
+], ids=["gleicher_tag", "offen_und_befristet", "enthalten"])
+def test_ueberschneidung(entries):
+    with pytest.raises(ValueError, match="Fahrzeug 602: Gültigkeitszeiträume überschneiden sich"):
+        compile_fleet(entries)
+
+def test_ab_nach_bis():
+    with pytest.raises(ValueError, match="Fahrzeug 602: gültig ab liegt nach gültig bis"):
+        compile_fleet([FleetEntry(602, "Gigaliner", 40, T("2025-04-01"), T("2025-03-31"))])
+
+# -------------------------------
+# Fuhrpark-Datei (CSV/YAML)
+# -------------------------------
+def test_csv_laden(tmp_path):
+    path = tmp_path / "fahrzeuge.csv"
+    path.write_text(
+        "nummer;art;zulage;gueltig_ab;gueltig_bis\n"
+        "602;Tandem;;;31.03.2025\n"
+        "602;Gigaliner;45;2025-04-01;\n"
+        "350;Tandem;25;;\n",
+        encoding="utf-8",
+    )
+    assert read_fleet_registry(path) == [
+        FleetEntry(602, "Tandem", ZULAGE_JE_ART["Tandem"], None, T("2025-03-31")),
+        FleetEntry(602, "Gigaliner", 45, T("2025-04-01"), None),
+        FleetEntry(350, "Tandem", 25, None, None),
+    ]
+    table = current_rate_table(str(path))
+    assert _rates(table, 602, ["2025-03-31", "2025-04-01"]) == [("Tandem", 20), ("Gigaliner", 45)]
+
+def test_yaml_laden(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "fahrzeuge.yaml"
+    path.write_text(
+        "zulagen:\n"
+        "  Gigaliner: 50\n"
+        "fahrzeuge:\n"
+        "  - {nummer: 602, art: Gigaliner, gueltig_ab: 2025-04-01}\n"
+        "  - {nummer: 350, art: Tandem, zulage: '', gueltig_bis: '31.12.2025'}\n"
+        "  - {nummer: 156, art: Gigaliner, zulage: 42}\n",
+        encoding="utf-8",
+    )
+    assert read_fleet_registry(path) == [
+        FleetEntry(602, "Gigaliner", 50, T("2025-04-01"), None),
+        FleetEntry(350, "Tandem", ZULAGE_JE_ART["Tandem"], None, T("2025-12-31")),
+        FleetEntry(156, "Gigaliner", 42, None, None),
+    ]
+
+@pytest.mark.parametrize("zeile, meldung", [
+    ("602;Sattelzug;;;", "Eintrag 1: keine Zulage für Art 'Sattelzug'"),
+    ("602;Gigaliner;40;32.01.2025;", "Eintrag 1: Ungültiges Datum '32.01.2025'"),
+    ("E-602;Gigaliner;40;;", "Eintrag 1: invalid literal"),
+], ids=["art_ohne_zulage", "datum", "nummer"])
+def test_csv_fehler(tmp_path, zeile, meldung):
+    path = tmp_path / "fahrzeuge.csv"
+    path.write_text("nummer;art;zulage;gueltig_ab;gueltig_bis\n" + zeile + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match=f"fahrzeuge.csv, {meldung}"):
+        read_fleet_registry(path)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from sonderzulage_berechnung import resolve_driver_names
+
+NBSP = "\u00a0"
+SPALTEN = ["Tour", "Nachname_DE", "Vorname_DE", "Nachname_GH", "Vorname_GH", "LKW1", "LKW", "Art", "Datum"]
+
+# -------------------------------
+# alte Schleife (bis user-001) als Referenz
+# -------------------------------
+def _clean_cell(x) -> str:
+    if pd.isna(x):
+        return ""
+    return str(x).replace(NBSP, " ").strip()
+
+def resolve_driver_names_iterrows(tmp: pd.DataFrame) -> pd.DataFrame:
+    tmp = tmp.copy()
+    for c in ["Nachname_DE", "Vorname_DE", "Nachname_GH", "Vorname_GH"]:
+        tmp[c] = tmp[c].apply(_clean_cell)
+
+    rows = []
+    for _, r in tmp.iterrows():
+        de_ok = (r["Nachname_DE"] != "" and r["Vorname_DE"] != "")
+        if de_ok:
+            nn, vn = r["Nachname_DE"], r["Vorname_DE"]
+        else:
+            nn, vn = r["Nachname_GH"], r["Vorname_GH"]
+        if (nn == "" or vn == ""):
+            continue
+        rows.append({
+            "Tour": r["Tour"],
+            "Nachname": nn,
+            "Vorname": vn,
+            "LKW1": r["LKW1"],
+            "LKW": r["LKW"],
+            "Art": r["Art"],
+            "Datum": r["Datum"],
+        })
+    return pd.DataFrame(rows)
+
+def _frame(rows: list) -> pd.DataFrame:
+    # Index wie nach dem AZ-Filter: Zeilennummern mit Lücken
+    return pd.DataFrame(rows, columns=SPALTEN, index=range(3, 3 + 2 * len(rows), 2))
+
+FAELLE = {
+    "nbsp_und_leerzeichen": [
+        [1001, f"Adler{NBSP}", " Philipp", None, None, 602, 602, "SZM", "01.01.2025"],
+        [1002, f"Al{NBSP}Khatib", f"Ali{NBSP}", "x", "y", None, 350, "Solo", "02.01.2025"],
+        [1003, "  Baum  ", "\tUwe\n", None, None, 156, np.nan, None, "03.01.2025"],
+    ],
+    "de_teilweise_leer": [
+        # nur Nachname in D -> G/H, nicht gemischt
+        [2001, "Adler", None, "Baum", "Uwe", None, 620, "SZM", "04.01.2025"],
+        [2002, None, "Philipp", "Krause", "Jan", None, 620, "SZM", "05.01.2025"],
+        [2003, NBSP, "Philipp", None, "Jan", None, 620, "SZM", "06.01.2025"],
+    ],
+    "gh_fallback": [
+        [None, None, None, "Adler", "Philipp", 602, 111, "SZM", "07.01.2025"],
+        [3002, "", " ", f"{NBSP}Baum", "Uwe", None, "Miete", None, "08.01.2025"],
+    ],
+    "alles_leer": [
+        [4001, None, None, None, None, 602, 602, "SZM", "09.01.2025"],
+        [4002, " ", NBSP, "", np.nan, None, 350, "Solo", "10.01.2025"],
+    ],
+    "nan_zellen": [
+        [np.nan, np.nan, np.nan, "Adler", "Philipp", np.nan, np.nan, np.nan, np.nan],
+        [5002, "Baum", "Uwe", np.nan, np.nan, np.nan, 156, np.nan, "11.01.2025"],
+        [5003, np.nan, "Uwe", np.nan, np.nan, np.nan, np.nan, np.nan, np.nan],
+    ],
+}
+
+@pytest.mark.parametrize("rows", FAELLE.values(), ids=FAELLE.keys())
+def test_resolve_driver_names_wie_iterrows(rows):
+    tmp = _frame(rows)
+    assert_frame_equal(resolve_driver_names(tmp), resolve_driver_names_iterrows(tmp))
+
+def test_resolve_driver_names_alle_faelle_zusammen():
+    tmp = _frame([row for rows in FAELLE.values() for row in rows])
+    assert_frame_equal(resolve_driver_names(tmp), resolve_driver_names_iterrows(tmp))
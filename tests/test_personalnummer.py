@@ -0,0 +1,8 @@
+from sonderzulage_berechnung import summary_cells
+
+def test_summary_cells_personalnummer_als_zahl_oder_text():
+    rows = summary_cells([("Philipp Adler", "00041450", 10.0), ("Uwe Baum", "P-100", 5.0),
+                          ("Jan Krause", "Unbekannt", 2.5)], "Januar 2025")
+    assert rows[4][1] == (1, 41450, "sum_pn_white_num")
+    assert rows[5][1] == (1, "P-100", "sum_pn_light")
+    assert rows[6][1] == (1, "Unbekannt", "sum_pn_white")
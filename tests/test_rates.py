@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from sonderzulage_berechnung import RATE_TABLE, apply_rate_table
+
+SPALTEN = ["LKW1", "LKW", "Datum"]
+
+# -------------------------------
+# alte Zeilenfunktionen (bis user-002) als Referenz
+# -------------------------------
+def define_art_alt(value: int) -> str:
+    if value in [602, 156]:
+        return "Gigaliner"
+    elif value in [350, 620]:
+        return "Tandem"
+    elif value in [520, 266, 458, 548, 541, 542, 543, 558]:
+        return "Gliederzug"
+    return "Unbekannt"
+
+def calculate_earnings(row):
+    earnings = 0
+    candidates = []
+
+    if pd.notnull(row["LKW1"]) and str(row["LKW1"]).isdigit():
+        candidates.append(int(row["LKW1"]))
+
+    if pd.notnull(row["LKW"]) and "-" in str(row["LKW"]):
+        tail = str(row["LKW"]).split("-")[1]
+        if tail.isdigit():
+            candidates.append(int(tail))
+
+    for v in candidates:
+        if v in [602, 156]:
+            earnings += 40
+        elif v in [620, 350, 520, 266, 458, 548, 541, 542, 543, 558]:
+            earnings += 20
+
+    return earnings
+
+def apply_alt(extracted: pd.DataFrame) -> pd.DataFrame:
+    extracted = extracted.copy()
+    extracted["LKW"] = extracted["LKW"].apply(lambda x: f"E-{x}" if pd.notnull(x) else x)
+    extracted["Art"] = extracted["LKW"].apply(
+        lambda x: define_art_alt(int(str(x).split("-")[1]))
+        if pd.notnull(x) and "-" in str(x) and str(x).split("-")[1].isdigit()
+        else "Unbekannt"
+    )
+    extracted["Verdienst"] = extracted.apply(calculate_earnings, axis=1).astype(np.int64)
+    return extracted
+
+WERTE = {
+    "int": [602, 156, 350, 620, 520, 558],
+    "float": [602.0, 350.0, 156.5],
+    "str": ["602", "350", "602-1", "350-2", "E-602", " 602", "602 "],
+    "nan": [np.nan, None],
+    "negativ": [-602, "-602", -1],
+    "riesig": [10 ** 20, "9" * 30, 2 ** 40 + 602],
+    "unbekannt": [0, 999, "Miete", "", "-", "E-", "602a"],
+}
+
+def _frame(lkw1: list, lkw: list) -> pd.DataFrame:
+    n = max(len(lkw1), len(lkw))
+    lkw1, lkw = (lkw1 * n)[:n], (lkw * n)[:n]
+    return pd.DataFrame({"LKW1": pd.Series(lkw1, dtype=object), "LKW": pd.Series(lkw, dtype=object),
+                         "Datum": ["01.01.2025"] * n}, columns=SPALTEN)
+
+def _vergleich(tmp: pd.DataFrame):
+    neu = apply_rate_table(tmp.copy(), RATE_TABLE)
+    alt = apply_alt(tmp)
+    assert_frame_equal(neu[["Art", "Verdienst"]], alt[["Art", "Verdienst"]], check_dtype=False)
+    # leere LKW-Zellen bleiben leer (None statt NaN ist egal), sonst "E-<wert>" wie bisher
+    assert (neu["LKW"].isna() == alt["LKW"].isna()).all()
+    assert (neu["LKW"].dropna() == alt["LKW"].dropna()).all()
+
+@pytest.mark.parametrize("werte", WERTE.values(), ids=WERTE.keys())
+def test_lkw1_wie_calculate_earnings(werte):
+    _vergleich(_frame(werte, [np.nan]))
+
+@pytest.mark.parametrize("werte", WERTE.values(), ids=WERTE.keys())
+def test_lkw_wie_calculate_earnings_und_define_art(werte):
+    _vergleich(_frame([np.nan], werte))
+
+def test_alle_werte_gekreuzt():
+    alle = [v for werte in WERTE.values() for v in werte]
+    _vergleich(_frame([a for a in alle for _ in alle], [b for _ in alle for b in alle]))
+
+def test_reine_zahlenspalten():
+    # so liefert der Reader Spalten ohne Text: int64 bzw. float64 mit NaN
+    tmp = pd.DataFrame({"LKW1": [602, 350, 999], "LKW": [156, 620, 1], "Datum": ["01.01.2025"] * 3})
+    _vergleich(tmp)
+    tmp = pd.DataFrame({"LKW1": [602.0, np.nan, 350.0], "LKW": [np.nan, 156.0, 620.0], "Datum": ["01.01.2025"] * 3})
+    _vergleich(tmp)
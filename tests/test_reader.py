@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+from pandas.testing import assert_frame_equal
+
+from sonderzulage_berechnung import read_touren
+
+# Stream-Leser (openpyxl read-only + pd.io.parsers.TextParser + _Witnesses) muss dieselben
+# Werte und Spaltentypen liefern wie pd.read_excel; sichert das gegen pandas-Updates ab
+
+def _mappe(path, rows: list, breite: int = 18):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Touren"
+    sheet.append([f"Spalte {i + 1}" for i in range(breite)])
+    for row in rows:
+        sheet.append(row[:breite])
+    workbook.save(path)
+    return path
+
+def _zeile(tour=4711, nachname="Adler", vorname="Philipp", lkw1=None, lkw=602, art="SZM", az="AZ",
+           datum="02.01.2025", q=None) -> list:
+    row = [None] * 18
+    row[0], row[3], row[4], row[10], row[11], row[12], row[13], row[14], row[16] = (
+        tour, nachname, vorname, lkw1, lkw, art, az, datum, q)
+    return row
+
+def _vergleich(path):
+    try:
+        expected = read_touren(path, "pandas")
+    except Exception as e:
+        with pytest.raises(type(e)):
+            read_touren(path, "stream")
+        return
+    assert_frame_equal(read_touren(path, "stream"), expected)
+
+def test_generator_mappe(touren_mappe):
+    _vergleich(touren_mappe)
+
+ZEILEN = [
+    _zeile(),
+    _zeile(tour="T-12", lkw="Miete", datum="03.01.2025", q="Q1"),
+    _zeile(tour=None, lkw1=156, lkw=602.5, art=None, az="az 1", q="Q2"),
+    _zeile(tour=12.5, nachname=" Baum ", vorname="Uwe", az="XAZ"),
+    _zeile(datum="31.12.2024"),
+    _zeile(datum="offen"),
+]
+
+@pytest.mark.parametrize("breite", [15, 16, 17, 18])
+def test_spaltenbreiten(tmp_path, breite):
+    _vergleich(_mappe(tmp_path / "b.xlsx", ZEILEN, breite))
+
+def test_echte_datumszellen(tmp_path):
+    rows = ZEILEN + [_zeile(datum=datetime(2025, 3, 4)), _zeile(datum=datetime(2024, 12, 31)),
+                     _zeile(tour=datetime(2025, 1, 5), datum="05.01.2025")]
+    _vergleich(_mappe(tmp_path / "d.xlsx", rows))
+
+def test_az_als_zahl(tmp_path):
+    rows = ZEILEN + [_zeile(az=1), _zeile(az=2.5), _zeile(az=None)]
+    _vergleich(_mappe(tmp_path / "n.xlsx", rows))
+
+def test_nur_zahlen_in_textspalten(tmp_path):
+    rows = [_zeile(nachname=1, vorname=2, art=3, q=4), _zeile(lkw=None, lkw1=620)]
+    _vergleich(_mappe(tmp_path / "z.xlsx", rows))
+
+@pytest.mark.parametrize("rows", [[], [_zeile(az="Frei")], [_zeile(datum="01.12.2024")]],
+                         ids=["ohne_zeilen", "ohne_az", "vor_2025"])
+def test_leere_blaetter(tmp_path, rows):
+    _vergleich(_mappe(tmp_path / "leer.xlsx", rows))
+
+def test_nur_kopfzeile_zu_schmal(tmp_path):
+    _vergleich(_mappe(tmp_path / "schmal.xlsx", [], breite=5))
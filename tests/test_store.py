@@ -0,0 +1,24 @@
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from sonderzulage_berechnung import (FAHRZEUG_ART, ZULAGE_JE_ART, FleetEntry, TourStore, compile_fleet,
+                                     extract_file)
+
+def _fleet(*extra) -> list:
+    # eingebaute Liste wie compile_rate_table + Änderungen
+    return [FleetEntry(nummer, art, ZULAGE_JE_ART.get(art, 0)) for nummer, art in FAHRZEUG_ART.items()] + list(extra)
+
+def test_load_rechnet_mit_aktuellem_fuhrpark(tmp_path, touren_mappe):
+    store = TourStore(str(tmp_path / "touren.sqlite"))
+    alt = extract_file(touren_mappe, touren_mappe.name).data
+    assert store.add(alt, quelle=touren_mappe.name) == len(alt)
+    assert_frame_equal(store.load()[["Art", "Verdienst"]], alt[["Art", "Verdienst"]], check_categorical=False)
+
+    # neues Fahrzeug 101 ab März 2025: gespeicherte Touren ab dann mit Zulage, ohne neuen Upload
+    neu = compile_fleet(_fleet(FleetEntry(101, "Tandem", 20, pd.Timestamp("2025-03-01"))))
+    erwartet = extract_file(touren_mappe, touren_mappe.name, neu).data
+    geladen = store.load(table=neu)
+    assert geladen["Verdienst"].sum() > alt["Verdienst"].sum()
+    assert_frame_equal(geladen[["LKW", "Art", "Verdienst"]], erwartet[["LKW", "Art", "Verdienst"]],
+                       check_categorical=False, check_dtype=False)
+    assert store.add(erwartet, quelle=touren_mappe.name) == 0